@@ -0,0 +1,51 @@
+"""Benchmark decoding ndarrays that are split into many `_rvalue` chunks.
+
+The decode time should scale linearly with the number of chunks.
+
+Usage: python benchmarks/bench_chunk_reassembly.py
+"""
+import time
+from functools import reduce
+
+import numpy as np
+
+from imjoy_rpc.hypha.rpc import RPC
+
+ARRAY_SIZE = 64 * 1024 * 1024  # 64MB
+
+
+def encode_chunked(array, chunk_num):
+    """Encode an array with its bytes split into `chunk_num` chunks."""
+    data = array.tobytes()
+    chunk_size = -(-len(data) // chunk_num)
+    return {
+        "_rtype": "ndarray",
+        "_rvalue": [
+            data[idx : idx + chunk_size] for idx in range(0, len(data), chunk_size)
+        ],
+        "_rshape": list(array.shape),
+        "_rdtype": str(array.dtype),
+    }
+
+
+def main():
+    """Run the benchmark."""
+    rpc = RPC(None, client_id="benchmark")
+    array = np.random.randint(0, 255, ARRAY_SIZE, dtype=np.uint8)
+    print(f"{'chunks':>8} {'preallocated (s)':>18} {'reduce (s)':>12}")
+    for chunk_num in [16, 64, 256, 1024]:
+        encoded = encode_chunked(array, chunk_num)
+        start = time.perf_counter()
+        decoded = rpc.decode(dict(encoded))
+        preallocated = time.perf_counter() - start
+        assert np.array_equal(decoded, array)
+
+        # The previous implementation, for comparison
+        start = time.perf_counter()
+        reduce(lambda x, y: x + y, encoded["_rvalue"])
+        concatenated = time.perf_counter() - start
+        print(f"{chunk_num:>8} {preallocated:>18.4f} {concatenated:>12.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark sending long messages in chunks over a link with latency.
+
+Two RPC instances are connected through an in-memory router which delays
+every message, the upload time of a large array is measured for different
+numbers of chunks in flight (`chunk_window`, 1 is the sequential upload).
+
+Usage: python benchmarks/bench_chunk_window.py
+"""
+import asyncio
+import time
+
+import msgpack
+import numpy as np
+
+from imjoy_rpc.hypha.rpc import RPC
+
+LATENCY = 0.05  # seconds, for each direction
+ARRAY_SIZE = 64 * 1024 * 1024  # 64MB
+
+
+class Connection:
+    """Route the messages between clients after a delay."""
+
+    def __init__(self, clients, client_id, latency):
+        """Set up the connection."""
+        self._clients = clients
+        self._client_id = client_id
+        self._latency = latency
+        self._handler = None
+        clients[client_id] = self
+
+    def on_message(self, handler):
+        """Register the message handler."""
+        self._handler = handler
+
+    async def emit_message(self, data):
+        """Send a message to the target client, as done by the server."""
+        if isinstance(data, (list, tuple)):
+            data = b"".join(data)
+        unpacker = msgpack.Unpacker()
+        unpacker.feed(data)
+        main = unpacker.unpack()
+        target = main["to"].split("/")[-1]
+        main.update({"to": "ws/" + target, "from": "ws/" + self._client_id, "user": {}})
+        data = msgpack.packb(main) + data[unpacker.tell() :]
+        loop = asyncio.get_running_loop()
+        loop.call_later(self._latency, self._clients[target]._handler, data)
+
+
+async def measure(chunk_window, array):
+    """Return the time to send the array to a remote service."""
+    clients = {}
+    sender, receiver = [
+        RPC(
+            Connection(clients, client_id, LATENCY),
+            client_id=client_id,
+            workspace="ws",
+            chunk_window=chunk_window,
+        )
+        for client_id in ["sender", "receiver"]
+    ]
+    receiver.add_service(
+        {"id": "echo", "config": {"visibility": "public"}, "size": lambda x: x.nbytes}
+    )
+    service = await sender.get_remote_service("receiver:echo")
+    start = time.perf_counter()
+    assert await service.size(array) == array.nbytes
+    return time.perf_counter() - start
+
+
+async def main():
+    """Run the benchmark."""
+    array = np.random.randint(0, 255, ARRAY_SIZE, dtype=np.uint8)
+    print(f"latency: {LATENCY * 1000:.0f}ms, size: {ARRAY_SIZE / 1e6:.0f}MB")
+    print(f"{'window':>8} {'time (s)':>10} {'MB/s':>8}")
+    for chunk_window in [1, 4, 8, 16, 32]:
+        elapsed = await measure(chunk_window, array)
+        print(f"{chunk_window:>8} {elapsed:>10.2f} {ARRAY_SIZE / 1e6 / elapsed:>8.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+"""Benchmark the ndarray compression on synthetic images.
+
+Compare the bytes on the wire and the encode/decode time of raw arrays,
+compressed arrays and byte shuffled + compressed arrays.
+
+Usage: python benchmarks/bench_ndarray_compression.py
+"""
+import time
+
+import numpy as np
+
+from imjoy_rpc.compression import COMPRESSION_CODECS, encode_ndarray
+from imjoy_rpc.hypha.rpc import RPC
+
+SHAPE = (2048, 2048)
+
+
+def make_images():
+    """Make synthetic microscopy-like images."""
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[: SHAPE[0], : SHAPE[1]]
+    blobs = np.zeros(SHAPE, dtype="float32")
+    for y, x in rng.integers(0, SHAPE[0], size=(64, 2)):
+        blobs += np.exp(-((yy - y) ** 2 + (xx - x) ** 2) / 800.0, dtype="float32")
+    labels = np.zeros(SHAPE, dtype="uint16")
+    for idx, (y, x) in enumerate(rng.integers(0, SHAPE[0] - 64, size=(500, 2))):
+        labels[y : y + 48, x : x + 48] = idx + 1
+    return {
+        "float32 smooth": blobs,
+        "float32 noisy": blobs + rng.normal(0, 0.01, SHAPE).astype("float32"),
+        "uint16 counts": rng.poisson(100 + 1000 * blobs).astype("uint16"),
+        "uint16 labels": labels,
+    }
+
+
+def measure(rpc, image, compression=None, shuffle=False):
+    """Return the encoded size and the encode/decode time."""
+    start = time.perf_counter()
+    if compression:
+        encoded = encode_ndarray(image, compression, shuffle)
+    else:
+        encoded = rpc.encode(image)
+    encode_time = time.perf_counter() - start
+    size = len(encoded["_rvalue"])
+    start = time.perf_counter()
+    decoded = rpc.decode(encoded)
+    decode_time = time.perf_counter() - start
+    assert np.array_equal(decoded, image)
+    return size, encode_time, decode_time
+
+
+def main():
+    """Run the benchmark."""
+    rpc = RPC(None, client_id="benchmark")
+    methods = [("raw", None, False)]
+    for compression in COMPRESSION_CODECS:
+        methods.append((compression, compression, False))
+        methods.append((f"shuffle+{compression}", compression, True))
+    print(
+        f"{'image':>16} {'encoding':>14} {'size (MB)':>10} {'ratio':>7} "
+        f"{'encode (s)':>11} {'decode (s)':>11}"
+    )
+    for name, image in make_images().items():
+        for label, compression, shuffle in methods:
+            size, encode_time, decode_time = measure(rpc, image, compression, shuffle)
+            print(
+                f"{name:>16} {label:>14} {size / 1e6:>10.2f} "
+                f"{image.nbytes / size:>7.1f} {encode_time:>11.4f} {decode_time:>11.4f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
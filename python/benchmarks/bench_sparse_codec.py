@@ -0,0 +1,49 @@
+"""Benchmark sending scipy sparse matrices compared to dense arrays.
+
+The sparse codec sends the `data`/`indices`/`indptr` arrays only, the
+dense path sends the full array (i.e. `matrix.toarray()`).
+
+Usage: python benchmarks/bench_sparse_codec.py
+"""
+import time
+
+import msgpack
+from scipy import sparse
+
+from imjoy_rpc.hypha.rpc import RPC
+
+SHAPE = (5000, 5000)
+
+
+def roundtrip(rpc, obj):
+    """Encode, pack, unpack and decode an object, return the size and time."""
+    start = time.perf_counter()
+    message = msgpack.packb(rpc.encode(obj))
+    decoded = rpc.decode(msgpack.unpackb(message))
+    return decoded, len(message), time.perf_counter() - start
+
+
+def main():
+    """Run the benchmark."""
+    rpc = RPC(None, client_id="benchmark")
+    print(
+        f"{'density':>8} {'format':>7} {'size (MB)':>10} {'time (s)':>9} "
+        f"{'dense (MB)':>11} {'dense (s)':>10}"
+    )
+    for density in [0.01, 0.001]:
+        matrix = sparse.random(
+            *SHAPE, density=density, format="csr", dtype="float32", random_state=0
+        )
+        dense = matrix.toarray()
+        _, dense_size, dense_time = roundtrip(rpc, dense)
+        for fmt in ["csr", "csc", "coo"]:
+            decoded, size, elapsed = roundtrip(rpc, matrix.asformat(fmt))
+            assert decoded.format == fmt and (decoded != matrix).nnz == 0
+            print(
+                f"{density:>8} {fmt:>7} {size / 1e6:>10.2f} {elapsed:>9.4f} "
+                f"{dense_size / 1e6:>11.2f} {dense_time:>10.4f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
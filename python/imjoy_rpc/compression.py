@@ -0,0 +1,146 @@
+"""Provide the compression of messages and ndarrays."""
+import zlib
+from collections import OrderedDict
+from functools import partial
+
+# Available compression codecs, (compress, decompress), in order of preference
+# Note: the decompress functions return at most `max_length` bytes if given
+COMPRESSION_CODECS = OrderedDict()
+try:
+    import zstandard
+
+    def _zstd_decompress(data, max_length=0):
+        if not max_length:
+            return zstandard.ZstdDecompressor().decompress(data)
+        return zstandard.ZstdDecompressor().stream_reader(data).read(max_length)
+
+    def _zstd_stream():
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+        # Note: the output of each call is not limited with zstd
+        return lambda data, max_length=0: decompressor.decompress(data)
+
+    COMPRESSION_CODECS["zstd"] = (
+        lambda data: zstandard.ZstdCompressor().compress(data),
+        _zstd_decompress,
+        _zstd_stream,
+    )
+except ImportError:
+    pass
+try:
+    import lz4.frame
+
+    def _lz4_stream():
+        decompressor = lz4.frame.LZ4FrameDecompressor()
+        return lambda data, max_length=0: decompressor.decompress(
+            data, max_length=max_length or -1
+        )
+
+    COMPRESSION_CODECS["lz4"] = (
+        lz4.frame.compress,
+        lambda data, max_length=0: _lz4_stream()(data, max_length),
+        _lz4_stream,
+    )
+except ImportError:
+    pass
+# Codec name -> (compress, decompress, create a stream decompress function)
+COMPRESSION_CODECS["zlib"] = (
+    partial(zlib.compress, level=1),
+    lambda data, max_length=0: zlib.decompressobj().decompress(data, max_length),
+    lambda: zlib.decompressobj().decompress,
+)
+
+
+def _decompress(compression, data, max_size=0):
+    """Decompress data with the given compression codec.
+
+    Raise an error if the decompressed data exceeds `max_size` bytes (if set).
+    """
+    if compression not in COMPRESSION_CODECS:
+        raise ValueError(f"Unsupported compression: {compression}")
+    data = COMPRESSION_CODECS[compression][1](data, max_size + 1 if max_size else 0)
+    if max_size and len(data) > max_size:
+        raise ValueError(f"Decompressed size exceeds the limit ({max_size})")
+    return data
+
+
+def _shuffle(np, data, itemsize):
+    """Group the bytes of the items by their significance (byte shuffle)."""
+    if itemsize <= 1:
+        return data
+    return np.frombuffer(data, np.uint8).reshape(-1, itemsize).T.tobytes()
+
+
+def _unshuffle(np, data, itemsize):
+    """Restore the item bytes grouped by `_shuffle`."""
+    if itemsize <= 1:
+        return data
+    return np.frombuffer(data, np.uint8).reshape(itemsize, -1).T.tobytes()
+
+
+def _compress_ndarray(np, array, compression, shuffle=True):
+    """Encode an ndarray with the bytes (shuffled and) compressed."""
+    if compression not in COMPRESSION_CODECS:
+        raise ValueError(f"Unsupported compression: {compression}")
+    data = np.ascontiguousarray(array)
+    if shuffle:
+        data = _shuffle(np, data, array.dtype.itemsize)
+    return {
+        "_rtype": "ndarray",
+        "_rvalue": COMPRESSION_CODECS[compression][0](data),
+        "_rshape": array.shape,
+        "_rdtype": str(array.dtype),
+        "_rcompression": compression,
+        "_rshuffle": shuffle,
+    }
+
+
+def _decompress_ndarray(np, encoded, max_size=0):
+    """Return the bytes of a compressed ndarray.
+
+    The decompressed data is limited to the size of the declared shape
+    (with numpy) and to `max_size` bytes (if set).
+    """
+    data = encoded["_rvalue"]
+    if isinstance(data, (list, tuple)):
+        data = b"".join(data)
+    if np:
+        nbytes = int(np.prod(encoded["_rshape"], dtype=np.int64))
+        nbytes *= np.dtype(encoded["_rdtype"]).itemsize
+        # Note: a limit of 0 is no limit
+        max_size = max(min(max_size, nbytes) if max_size else nbytes, 1)
+    data = _decompress(encoded["_rcompression"], data, max_size)
+    if encoded.get("_rshuffle"):
+        if not np:
+            raise Exception("numpy is required to decode shuffled ndarrays")
+        data = _unshuffle(np, data, np.dtype(encoded["_rdtype"]).itemsize)
+    return data
+
+
+def _join_chunks(np, chunks, shape, dtype):
+    """Join the chunks of an ndarray into one preallocated buffer."""
+    if not np:
+        return b"".join(chunks)
+    array = np.empty(tuple(shape), dtype=dtype)
+    flat = array.reshape(-1).view(np.uint8)
+    offset = 0
+    for chunk in chunks:
+        size = len(chunk)
+        if offset + size > flat.size:
+            raise ValueError("The ndarray chunks exceed the declared shape")
+        flat[offset : offset + size] = np.frombuffer(chunk, dtype=np.uint8)
+        offset += size
+    if offset != flat.size:
+        raise ValueError("The ndarray chunks do not match the declared shape")
+    return flat.data
+
+
+def encode_ndarray(array, compression="zlib", shuffle=True):
+    """Encode an ndarray compressed, optionally with a byte shuffle filter.
+
+    The encoded array can be passed to a remote method in place of the
+    array itself, e.g. to compress the arrays of a single call.
+    Note: the remote peer needs to support compressed ndarrays.
+    """
+    import numpy as np
+
+    return _compress_ndarray(np, np.asarray(array), compression, shuffle)
@@ -11,7 +11,7 @@ from IPython.display import HTML, display
 
 from imjoy_rpc.connection.jupyter_connection import put_buffers, remove_buffers
 from imjoy_rpc.rpc import RPC
-from imjoy_rpc.utils import MessageEmitter, dotdict
+from imjoy_rpc.utils import CodecRegistry, MessageEmitter, dotdict
 
 logging.basicConfig(stream=sys.stdout)
 logger = logging.getLogger("ColabConnection")
@@ -32,7 +32,7 @@ class ColabManager:
         self.clients = {}
         self.interface = None
         self.rpc_context = rpc_context
-        self._codecs = {}
+        self._codecs = CodecRegistry()
         # for loading plugin from source code,
         # we can benifit from the syntax highlighting for HTML()
         self.register_codec({"name": "HTML", "type": HTML, "encoder": lambda x: x.data})
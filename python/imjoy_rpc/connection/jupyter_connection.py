@@ -11,7 +11,7 @@ from IPython import get_ipython
 from IPython.display import display, HTML, Javascript
 
 from imjoy_rpc.rpc import RPC
-from imjoy_rpc.utils import MessageEmitter, dotdict
+from imjoy_rpc.utils import CodecRegistry, MessageEmitter, dotdict
 import contextvars
 
 logging.basicConfig(stream=sys.stdout)
@@ -29,7 +29,7 @@ class JupyterCommManager:
         self.clients = {}
         self.interface = None
         self.rpc_context = rpc_context
-        self._codecs = {}
+        self._codecs = CodecRegistry()
         connection_file = ipykernel.connect.get_connection_file()
         if "kernel-" in connection_file:
             self.kernel_id = re.search(
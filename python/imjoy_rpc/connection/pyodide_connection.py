@@ -7,7 +7,7 @@ import contextvars
 import pyodide
 
 from imjoy_rpc.rpc import RPC
-from imjoy_rpc.utils import MessageEmitter, dotdict
+from imjoy_rpc.utils import CodecRegistry, MessageEmitter, dotdict
 
 
 import js
@@ -29,7 +29,7 @@ class PyodideConnectionManager:
         self.clients = {}
         self.interface = None
         self.rpc_context = rpc_context
-        self._codecs = {}
+        self._codecs = CodecRegistry()
         self.rpc_id = "pyodide_rpc"
         self.default_config["allow_execution"] = True
 
@@ -9,7 +9,7 @@ from urllib.parse import urlparse
 import socketio
 
 from imjoy_rpc.rpc import RPC
-from imjoy_rpc.utils import MessageEmitter, dotdict
+from imjoy_rpc.utils import CodecRegistry, MessageEmitter, dotdict
 
 logging.basicConfig(stream=sys.stdout)
 logger = logging.getLogger("SocketIOConnection")
@@ -26,7 +26,7 @@ class SocketIOManager:
         self.clients = {}
         self.interface = None
         self.rpc_context = rpc_context
-        self._codecs = {}
+        self._codecs = CodecRegistry()
 
     def get_ident(self):
         """Return identity."""
@@ -1,5 +1,6 @@
 """Provide hypha-rpc to connecting to Hypha server."""
 
+from ..compression import encode_ndarray
 from .rpc import RPC
 from .sync import connect_to_server as connect_to_server_sync
 from .sync import get_rtc_service as get_rtc_service_sync
@@ -10,6 +11,7 @@ from .websocket_client import connect_to_server, login, setup_local_client
 
 __all__ = [
     "RPC",
+    "encode_ndarray",
     "login",
     "connect_to_server",
     "login_sync",
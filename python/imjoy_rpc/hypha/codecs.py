@@ -0,0 +1,247 @@
+"""Provide the built-in codecs for optional libraries."""
+
+
+def _encode_strings(np, pd, values):
+    """Encode strings as utf-8 data with offsets, missing values are masked."""
+    mask = np.asarray(pd.isna(values), dtype=bool)
+    items = [
+        b"" if missing else value.encode("utf-8")
+        for value, missing in zip(values, mask)
+    ]
+    offsets = np.zeros(len(items) + 1, dtype="int64")
+    np.cumsum(np.fromiter(map(len, items), "int64", len(items)), out=offsets[1:])
+    return {
+        "kind": "string",
+        "dtype": str(values.dtype),
+        "offsets": offsets,
+        "data": b"".join(items),
+        "mask": mask if mask.any() else None,
+    }
+
+
+def _decode_strings(np, encoded):
+    """Decode the strings encoded by `_encode_strings`."""
+    data = bytes(encoded["data"])
+    offsets = encoded["offsets"].tolist()
+    values = np.empty(len(offsets) - 1, dtype=object)
+    text = data.decode("utf-8")
+    if len(text) == len(data):
+        # ascii only, the byte offsets are also the character offsets
+        values[:] = [text[start:end] for start, end in zip(offsets, offsets[1:])]
+    else:
+        values[:] = [
+            data[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])
+        ]
+    if encoded.get("mask") is not None:
+        values[encoded["mask"]] = None
+    return values
+
+
+def _encode_column(np, pd, values):
+    """Encode the values of a column or an index."""
+    dtype = values.dtype
+    if isinstance(values, pd.RangeIndex):
+        return {
+            "kind": "range",
+            "start": values.start,
+            "stop": values.stop,
+            "step": values.step,
+        }
+    if isinstance(values, pd.MultiIndex):
+        return {
+            "kind": "multi",
+            "levels": [
+                _encode_column(np, pd, values.get_level_values(idx))
+                for idx in range(values.nlevels)
+            ],
+        }
+    if isinstance(dtype, pd.CategoricalDtype):
+        return {
+            "kind": "categorical",
+            "codes": np.asarray(pd.Categorical(values).codes),
+            "categories": _encode_column(np, pd, dtype.categories),
+            "ordered": bool(dtype.ordered),
+        }
+    if isinstance(dtype, pd.DatetimeTZDtype) or (
+        isinstance(values, pd.DatetimeIndex) and values.freq
+    ):
+        # datetimes with a time zone or a frequency, as int64 (in UTC)
+        values = pd.DatetimeIndex(values)
+        return {
+            "kind": "datetime",
+            "values": values.asi8,
+            "unit": np.datetime_data(values.dtype.base)[0],
+            "tz": str(values.tz) if values.tz else None,
+            "freq": values.freqstr,
+        }
+    if isinstance(dtype, pd.PeriodDtype):
+        return {
+            "kind": "period",
+            "values": pd.PeriodIndex(values).asi8,
+            "dtype": str(dtype),
+        }
+    if isinstance(dtype, pd.IntervalDtype):
+        values = pd.IntervalIndex(values)
+        return {
+            "kind": "interval",
+            "left": _encode_column(np, pd, values.left),
+            "right": _encode_column(np, pd, values.right),
+            "closed": values.closed,
+        }
+    if isinstance(dtype, np.dtype) and dtype.kind in "biufcmM":
+        # numeric, boolean and datetime values as a typed buffer
+        return {"kind": "array", "values": values.to_numpy()}
+    if pd.api.types.infer_dtype(values, skipna=True) in ("string", "empty"):
+        return _encode_strings(np, pd, values)
+    # other values are encoded one by one, with None for missing values
+    mask = np.asarray(pd.isna(values), dtype=bool)
+    return {
+        "kind": "list",
+        "dtype": str(dtype),
+        "values": [
+            None if missing else value for value, missing in zip(values.tolist(), mask)
+        ],
+    }
+
+
+def _decode_column(np, pd, encoded):
+    """Decode the values of a column or an index, as an array or an Index."""
+    kind = encoded["kind"]
+    if kind == "range":
+        return pd.RangeIndex(encoded["start"], encoded["stop"], encoded["step"])
+    if kind == "multi":
+        return pd.MultiIndex.from_arrays(
+            [_decode_column(np, pd, level) for level in encoded["levels"]]
+        )
+    if kind == "categorical":
+        return pd.Categorical.from_codes(
+            encoded["codes"],
+            categories=_decode_column(np, pd, encoded["categories"]),
+            ordered=encoded["ordered"],
+        )
+    if kind == "array":
+        return encoded["values"]
+    if kind == "datetime":
+        values = pd.DatetimeIndex(
+            np.asarray(encoded["values"]).view(f"datetime64[{encoded['unit']}]")
+        )
+        if encoded["tz"]:
+            values = values.tz_localize("UTC").tz_convert(encoded["tz"])
+        if encoded["freq"]:
+            values = pd.DatetimeIndex(values, freq=encoded["freq"])
+        return values
+    if kind == "period":
+        return pd.arrays.PeriodArray(
+            np.asarray(encoded["values"]),
+            dtype=pd.api.types.pandas_dtype(encoded["dtype"]),
+        )
+    if kind == "interval":
+        return pd.arrays.IntervalArray.from_arrays(
+            _decode_column(np, pd, encoded["left"]),
+            _decode_column(np, pd, encoded["right"]),
+            closed=encoded["closed"],
+        )
+    if kind == "string":
+        values = _decode_strings(np, encoded)
+        if encoded["dtype"] != "object":
+            return pd.array(values, dtype=encoded["dtype"])
+        return values
+    if kind == "list":
+        return pd.array(encoded["values"], dtype=encoded["dtype"])
+    raise ValueError(f"Unsupported column kind: {kind}")
+
+
+def get_dataframe_codec(np, pd):
+    """Return the codec for pandas DataFrames.
+
+    The DataFrame is encoded column by column, numeric columns as typed
+    buffers (i.e. ndarrays) and string columns as utf-8 data with offsets.
+    """
+
+    def encoder(df):
+        return {
+            "_rtype": "pandas.DataFrame",
+            "columns": [
+                _encode_column(np, pd, df.iloc[:, idx]) for idx in range(df.shape[1])
+            ],
+            "index": _encode_column(np, pd, df.index),
+            "index_names": list(df.index.names),
+            "column_index": _encode_column(np, pd, df.columns),
+            "column_names": list(df.columns.names),
+        }
+
+    def decoder(encoded):
+        columns = [_decode_column(np, pd, column) for column in encoded["columns"]]
+        index = _decode_column(np, pd, encoded["index"])
+        df = pd.DataFrame(
+            dict(enumerate(columns)),
+            index=index if isinstance(index, pd.Index) else pd.Index(index),
+        )
+        df.columns = _decode_column(np, pd, encoded["column_index"])
+        df.index.names = encoded["index_names"]
+        df.columns.names = encoded["column_names"]
+        return df
+
+    return {
+        "name": "pandas.DataFrame",
+        "type": pd.DataFrame,
+        "encoder": encoder,
+        "decoder": decoder,
+    }
+
+
+def get_sparse_codec(sparse):
+    """Return the codec for scipy sparse matrices and arrays.
+
+    CSR/CSC matrices are encoded with their `data`, `indices` and `indptr`
+    arrays, COO matrices with `data`, `row` and `col`, as typed buffers
+    (i.e. ndarrays). Other formats are sent as CSR and converted back.
+    """
+    sparse_types = (sparse.spmatrix,)
+    if hasattr(sparse, "sparray"):
+        sparse_types += (sparse.sparray,)
+
+    def encoder(matrix):
+        is_array = hasattr(sparse, "sparray") and isinstance(matrix, sparse.sparray)
+        encoded = {
+            "_rtype": "scipy.sparse",
+            "format": matrix.format,
+            "shape": [int(size) for size in matrix.shape],
+            "array": is_array,
+        }
+        if matrix.format == "coo":
+            encoded.update({"data": matrix.data, "row": matrix.row, "col": matrix.col})
+        else:
+            if matrix.format not in ("csr", "csc"):
+                matrix = matrix.tocsr()
+            encoded.update(
+                {
+                    "data": matrix.data,
+                    "indices": matrix.indices,
+                    "indptr": matrix.indptr,
+                }
+            )
+        return encoded
+
+    def decoder(encoded):
+        fmt = encoded["format"]
+        shape = tuple(encoded["shape"])
+        suffix = (
+            "array" if encoded["array"] and hasattr(sparse, "sparray") else "matrix"
+        )
+        if fmt == "coo":
+            return getattr(sparse, "coo_" + suffix)(
+                (encoded["data"], (encoded["row"], encoded["col"])), shape=shape
+            )
+        base = fmt if fmt in ("csr", "csc") else "csr"
+        matrix = getattr(sparse, f"{base}_{suffix}")(
+            (encoded["data"], encoded["indices"], encoded["indptr"]), shape=shape
+        )
+        return matrix if base == fmt else matrix.asformat(fmt)
+
+    return {
+        "name": "scipy.sparse",
+        "type": sparse_types,
+        "encoder": encoder,
+        "decoder": decoder,
+    }
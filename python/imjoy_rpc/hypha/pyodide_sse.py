@@ -68,6 +68,8 @@ class PyodideSSERPCConnection:
         if not self._websocket:
             await self.open()
         try:
+            if isinstance(data, (list, tuple)):
+                data = b"".join(data)
             data = to_js(data)
             self._websocket.send(data)
         except Exception as exp:
@@ -177,6 +177,8 @@ class PyodideWebsocketRPCConnection:
         if not self._websocket:
             await self.open()
         try:
+            if isinstance(data, (list, tuple)):
+                data = b"".join(data)
             data = to_js(data)
             self._websocket.send(data)
         except Exception as exp:
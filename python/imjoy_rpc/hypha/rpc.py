@@ -1,20 +1,35 @@
 """Provide the RPC."""
 import asyncio
+import hashlib
 import inspect
 import io
 import logging
-import math
+import mmap
+import os
+import struct
 import sys
+import tempfile
+import time
 import traceback
 import weakref
 from collections import OrderedDict
-from functools import partial, reduce
+from functools import partial
 
 import msgpack
 import shortuuid
 
+from ..compression import (
+    COMPRESSION_CODECS,
+    _compress_ndarray,
+    _decompress,
+    _decompress_ndarray,
+    _join_chunks,
+)
+from ..utils import CodecRegistry
+from .codecs import get_dataframe_codec, get_sparse_codec
 from .utils import (
     FuturePromise,
+    LazyDotDict,
     MessageEmitter,
     dotdict,
     format_traceback,
@@ -24,6 +39,46 @@ from .utils import (
 )
 
 CHUNK_SIZE = 1024 * 500
+# Maximum size of the received frames (i.e. messages which are not chunked)
+MAX_FRAME_SIZE = CHUNK_SIZE * 2
+# Bounds of the chunk size adapted to the link with each target
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+# Target time (in seconds) to send one chunk
+CHUNK_TARGET_TIME = 0.1
+# Size reserved for the header of the messages carrying chunks
+CHUNK_MESSAGE_HEADER = 1024
+# Size reserved in the frames for the message header and the fields added by
+# the server when routing the message (e.g. the user info)
+CHUNK_MESSAGE_OVERHEAD = 16 * 1024
+# Number of chunks of a long message being sent at the same time
+CHUNK_WINDOW = 16
+# Attempts (and the delay in seconds) to resume the upload of a long message
+CHUNK_RESUME_RETRIES = 5
+CHUNK_RESUME_DELAY = 3
+# Time (in seconds) the incomplete messages are kept in the message cache
+MESSAGE_CACHE_TTL = 600
+# Maximum size of the (decompressed) messages received in chunks
+MAX_MESSAGE_BUFFER_SIZE = 1024 * 1024 * 1024
+# Maximum size of the incomplete messages in memory
+MESSAGE_CACHE_SIZE = 1024 * 1024 * 1024
+# msgpack ext type codes used to reference out-of-band buffers
+OOB_BUFFER_EXT = 1
+OOB_BYTES_EXT = 2
+# Smaller payloads are kept inline in the msgpack data
+OOB_MIN_SIZE = 1024
+# Maximum number of cached remote methods of services
+REMOTE_METHOD_CACHE_SIZE = 1024
+# Maximum number of peers for which the negotiated state is kept
+PEER_CACHE_SIZE = 1024
+# Size of the data fed to the unpacker at once, to unpack the main message
+UNPACKER_FEED_SIZE = 64 * 1024
+# Smaller messages are packed into one buffer, larger ones are sent as a list
+PACK_JOIN_SIZE = 64 * 1024
+# Smaller messages are not compressed
+COMPRESSION_THRESHOLD = 4096
+# Smaller ndarrays are not compressed
+NDARRAY_COMPRESSION_THRESHOLD = 64 * 1024
 API_VERSION = "0.3.0"
 ALLOWED_MAGIC_METHODS = ["__enter__", "__exit__"]
 IO_PROPS = [
@@ -77,12 +132,638 @@ def index_object(obj, ids):
         return index_object(_obj, ids[1:])
 
 
+# Types which can be passed to msgpack without encoding (checked exactly)
+PLAIN_TYPES = {int, float, bool, str, bytes, type(None)}
+PLAIN_CONTAINER_TYPES = {dict, dotdict, list, tuple}
+
+
+def _is_plain_data(
+    a_object, max_bytes_size=None, container_types=PLAIN_CONTAINER_TYPES
+):
+    """Check if a list/dict only contains primitive data.
+
+    Dictionaries with `_rtype` and bytes larger than `max_bytes_size`
+    are not considered as plain data.
+    """
+    if type(a_object) not in container_types:
+        return False
+    stack = [a_object]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, dict):
+            if "_rtype" in obj:
+                return False
+            # Note: a dotdict with a "values" key shadows the method
+            values = dict.values(obj)
+        else:
+            values = obj
+        for value in values:
+            tp = type(value)
+            if tp in container_types:
+                stack.append(value)
+            elif tp in PLAIN_CONTAINER_TYPES:
+                return False
+            elif tp not in PLAIN_TYPES:
+                return False
+            elif (
+                max_bytes_size is not None
+                and tp is bytes
+                and len(value) >= max_bytes_size
+            ):
+                return False
+    return True
+
+
+def _is_service_method(a_object):
+    """Check if an encoded object is a method of a service."""
+    return (
+        isinstance(a_object, dict)
+        and dict.get(a_object, "_rtype") == "method"
+        and str(dict.get(a_object, "_rmethod", "")).startswith("services.")
+    )
+
+
+def _plain_to_dotdict(a_object):
+    """Convert the dictionaries in plain data into dotdict."""
+    if isinstance(a_object, dict):
+        return dotdict(
+            {
+                k: _plain_to_dotdict(v) if type(v) in PLAIN_CONTAINER_TYPES else v
+                for k, v in dict.items(a_object)
+            }
+        )
+    return [
+        _plain_to_dotdict(v) if type(v) in PLAIN_CONTAINER_TYPES else v
+        for v in a_object
+    ]
+
+
+class InlineBuffers(list):
+    """Collect the large binary payloads to pack them inline, without a copy.
+
+    The payloads are referenced in the encoded object as for out-of-band
+    buffers, with a random marker to find the references in the packed data
+    (see `_inline_buffers`).
+    """
+
+    def __init__(self):
+        """Set up the buffers."""
+        super().__init__()
+        self.marker = os.urandom(12)
+
+
+def _add_buffer(buffers, buffer, code=OOB_BUFFER_EXT):
+    """Append a buffer to the out-of-band list and return its reference."""
+    buffers.append(buffer)
+    marker = buffers.marker if isinstance(buffers, InlineBuffers) else b""
+    return msgpack.ExtType(code, marker + struct.pack("<I", len(buffers) - 1))
+
+
+def _bin_header(size):
+    """Return the msgpack header of binary data."""
+    if size < 0x100:
+        return struct.pack(">BB", 0xC4, size)
+    if size < 0x10000:
+        return struct.pack(">BH", 0xC5, size)
+    return struct.pack(">BI", 0xC6, size)
+
+
+def _inline_buffers(data, buffers):
+    """Replace the buffer references in packed data with the buffers.
+
+    The buffers are packed as binary data, return the pieces of the packed
+    data (views of the data and the buffers, which are not copied).
+    """
+    marker = buffers.marker
+    view = memoryview(data)
+    pieces = []
+    start = 0
+    position = data.find(marker)
+    while position >= 0:
+        # The reference is a fixext 16: 0xd8, the ext code, the marker and
+        # the buffer index
+        if data[position - 2] != 0xD8:
+            raise ValueError("Invalid buffer reference")
+        index = struct.unpack_from("<I", data, position + len(marker))[0]
+        buffer = memoryview(buffers[index])
+        pieces.extend([view[start : position - 2], _bin_header(buffer.nbytes), buffer])
+        start = position + len(marker) + 4
+        position = data.find(marker, start)
+    pieces.append(view[start:])
+    return pieces
+
+
+def _resolve_buffer(buffers, code, data):
+    """Resolve an out-of-band buffer reference (used as msgpack ext_hook)."""
+    if code == OOB_BUFFER_EXT:
+        return buffers[struct.unpack("<I", data)[0]]
+    if code == OOB_BYTES_EXT:
+        return bytes(buffers[struct.unpack("<I", data)[0]])
+    return msgpack.ExtType(code, data)
+
+
+def _iter_chunks(package, chunk_size, start=0, aligned=False):
+    """Split a message package (bytes or a list of buffers) into chunks.
+
+    The chunks start at `start` bytes in the package. If `aligned`, the
+    chunks do not span several buffers (i.e. they start with each buffer).
+    `chunk_size` can be a function, called for the size of each chunk.
+    """
+    if not isinstance(package, (list, tuple)):
+        package = [package]
+    get_size = chunk_size if callable(chunk_size) else lambda: chunk_size
+    size = get_size()
+    pending, pending_size = [], 0
+    for buffer in package:
+        view = memoryview(buffer)
+        if start >= len(view):
+            start -= len(view)
+            continue
+        view, start = view[start:], 0
+        offset = 0
+        while offset < len(view):
+            piece = view[offset : offset + size - pending_size]
+            offset += len(piece)
+            pending.append(piece)
+            pending_size += len(piece)
+            if pending_size == size:
+                yield b"".join(pending)
+                pending, pending_size = [], 0
+                size = get_size()
+        if aligned and pending:
+            yield b"".join(pending)
+            pending, pending_size = [], 0
+            size = get_size()
+    if pending:
+        yield b"".join(pending)
+
+
+def _hash_chunk(data):
+    """Return the content hash of a chunk."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _package_format(main):
+    """Return the compression and the out-of-band buffer sizes of a package.
+
+    The buffer sizes are removed from the main message, the compression is
+    kept until the message is dispatched (see `RPC._dispatch_message`).
+    """
+    if not isinstance(main, dict):
+        raise ValueError("Invalid main message")
+    compression = main.get("compression")
+    if compression and compression not in COMPRESSION_CODECS:
+        raise ValueError(f"Unsupported compression: {compression}")
+    return compression, main.pop("buffers", None)
+
+
 class RemoteException(Exception):
     """Represent a remote exception."""
 
     pass
 
 
+class ObjectRefs:
+    """Track the binary objects of one encoded payload.
+
+    Objects which occur more than once are moved to `values` and replaced
+    by references (`{"_rtype": "ref", "_rvalue": index}`).
+    """
+
+    def __init__(self):
+        """Set up the tracked objects."""
+        self.values = []
+        # id -> [object, container, key, reference]
+        self._seen = {}
+
+    def add(self, obj, container, key):
+        """Record the location of the encoded object."""
+        # Note: the object is kept alive, so its id cannot be reused
+        self._seen[id(obj)] = [obj, container, key, None]
+
+    def get(self, obj):
+        """Return the reference to an object seen before, or None."""
+        entry = self._seen.get(id(obj))
+        if entry is None:
+            return None
+        if entry[3] is None:
+            # Move the first occurrence to the values
+            _, container, key, _ = entry
+            entry[3] = {"_rtype": "ref", "_rvalue": len(self.values)}
+            self.values.append(container[key])
+            container[key] = entry[3]
+        return entry[3]
+
+    def wrap(self, encoded):
+        """Wrap the encoded payload with the referenced values."""
+        if not self.values:
+            return encoded
+        return {"_rtype": "refs", "_rvalue": encoded, "_rrefs": self.values}
+
+
+class MessageBuffer:
+    """Collect the chunks of a message sent through the message cache.
+
+    With a declared size, the chunks are written at their offsets into a
+    preallocated buffer, otherwise they are kept by index and joined once.
+    With `spill`, the buffer is a memory-mapped temporary file in `spill_dir`.
+    The message expires if it is not updated for `ttl` seconds. The data
+    received from the start of the message is passed to the `decoder` (if any)
+    as it arrives.
+    """
+
+    def __init__(self, size=None, spill=False, spill_dir=None, ttl=None, decoder=None):
+        """Set up the buffer."""
+        self.size = size
+        self.ttl = ttl
+        self.decoder = decoder
+        self.spilled = bool(spill and size)
+        if size is None:
+            self._buffer = None
+        elif self.spilled:
+            # Note: the mapping stays valid after the (deleted) file is closed
+            with tempfile.TemporaryFile(dir=spill_dir) as file:
+                file.truncate(size)
+                self._buffer = mmap.mmap(file.fileno(), size)
+        else:
+            self._buffer = bytearray(size)
+        # chunk index -> chunk, or offset -> chunk size with a declared size
+        self._chunks = {}
+        self._end = 0
+        self._received = 0
+        # End of the data received from the start (without overlapping chunks)
+        self._contiguous = 0
+        self.updated = time.monotonic()
+
+    @property
+    def nbytes(self):
+        """Return the size of the message in memory."""
+        decoded = self.decoder.nbytes if self.decoder else 0
+        if self.spilled:
+            return decoded
+        return decoded + (self._received if self._buffer is None else self.size)
+
+    def expired(self, now):
+        """Check if the message was not updated within its TTL."""
+        return bool(self.ttl) and self.updated + self.ttl < now
+
+    def append(self, data, index=None, offset=None):
+        """Add a chunk at its index or offset, or after the last chunk."""
+        self.updated = time.monotonic()
+        if self._buffer is None:
+            if offset is not None:
+                raise ValueError("Offsets require a declared message size")
+            index = len(self._chunks) if index is None else index
+            self._received += len(data) - len(self._chunks.get(index, b""))
+            self._chunks[index] = data
+            return
+        if offset is None:
+            offset = self._end
+        end = offset + len(data)
+        if end > self.size:
+            raise ValueError("The chunk exceeds the declared message size")
+        self._buffer[offset:end] = data
+        self._chunks[offset] = len(data)
+        self._end = max(self._end, end)
+        if self.decoder and offset == self._contiguous:
+            start = self._contiguous
+            while self._contiguous in self._chunks:
+                self._contiguous += self._chunks[self._contiguous]
+            self.decoder.feed(memoryview(self._buffer)[start : self._contiguous])
+
+    def committed(self):
+        """Return the size of the received data from the start of the message."""
+        chunks = self._chunks
+        if self._buffer is None:
+            size, idx = 0, 0
+            while idx in chunks:
+                size += len(chunks[idx])
+                idx += 1
+            return size
+        end = 0
+        for offset in sorted(chunks):
+            if offset > end:
+                break
+            end = max(end, offset + chunks[offset])
+        return end
+
+    def decoded(self):
+        """Return the decoder if it decoded the complete message."""
+        decoder = self.decoder
+        if decoder is None or decoder.main is None or self._contiguous != self.size:
+            return None
+        return decoder
+
+    def getbuffer(self):
+        """Return the complete message."""
+        chunks = self._chunks
+        if self._buffer is None:
+            if chunks and max(chunks) != len(chunks) - 1:
+                raise ValueError("The message is missing chunks")
+            return b"".join(chunks[idx] for idx in range(len(chunks)))
+        # Note: the chunks can overlap, e.g. when an upload is resumed
+        if self.committed() != self.size:
+            raise ValueError("The message is missing chunks")
+        return memoryview(self._buffer)
+
+
+class MessageDecoder:
+    """Decode a message package as its data arrives.
+
+    The main message is unpacked as soon as it is received, and the data
+    after it is decompressed as it arrives (if the message is compressed).
+    """
+
+    def __init__(self, max_buffer_size=0, max_size=0):
+        """Set up the decoder.
+
+        Decoding stops if the decompressed data exceeds `max_size` (if set).
+        """
+        self.main = None
+        # Offset of the data after the main message
+        self.offset = None
+        self.compression = None
+        self.buffer_sizes = None
+        self._unpacker = msgpack.Unpacker(max_buffer_size=max_buffer_size)
+        self._position = 0
+        self._max_size = max_size
+        self._decompress = None
+        self._decompressed = bytearray()
+
+    @property
+    def nbytes(self):
+        """Return the size of the decompressed data."""
+        return len(self._decompressed)
+
+    def feed(self, data):
+        """Decode the next data of the message.
+
+        Decoding stops on invalid data, the message is then unpacked as a
+        whole when it is complete.
+        """
+        if self._unpacker is not None:
+            # Only the beginning of the data is fed until the main message
+            # is unpacked, as done by `RPC._unpack_message`
+            fed = 0
+            try:
+                while self.main is None and fed < len(data):
+                    size = min(max(self._position, UNPACKER_FEED_SIZE), len(data) - fed)
+                    self._unpack_main(data[fed : fed + size])
+                    fed += size
+                    self._position += size
+            except Exception:
+                self._unpacker = None
+                return
+            if self.main is None:
+                return
+            data = data[fed - (self._position - self.offset) :]
+            self._unpacker = None
+        if self._decompress is not None and len(data):
+            max_length = 0
+            if self._max_size:
+                max_length = self._max_size - len(self._decompressed) + 1
+            try:
+                self._decompressed += self._decompress(data, max_length)
+                if self._max_size and len(self._decompressed) > self._max_size:
+                    raise ValueError("Decompressed size exceeds the limit")
+            except Exception:
+                self.main = None
+                self._decompress = None
+                self._decompressed = bytearray()
+
+    def _unpack_main(self, data):
+        """Unpack the main message once it is received."""
+        self._unpacker.feed(data)
+        try:
+            main = self._unpacker.unpack()
+        except msgpack.exceptions.OutOfData:
+            return
+        self.compression, self.buffer_sizes = _package_format(main)
+        if self.compression:
+            self._decompress = COMPRESSION_CODECS[self.compression][2]()
+        self.offset = self._unpacker.tell()
+        self.main = main
+
+    def decompressed(self):
+        """Return the decompressed data after the main message."""
+        return memoryview(self._decompressed)
+
+
+class MessageCache(OrderedDict):
+    """Keep the messages being received in chunks, by key.
+
+    The messages are ordered from the least recently updated. Messages
+    expire when not updated within their TTL, and with `max_size` the least
+    recently updated ones are evicted to keep the messages in memory within
+    `max_size` bytes (the spilled messages are not counted). With a `loop`,
+    the expired messages are also removed every `ttl` seconds while the cache
+    is not empty, so they are freed when no other messages arrive.
+    """
+
+    def __init__(self, ttl=None, max_size=None, loop=None):
+        """Set up the cache."""
+        super().__init__()
+        self.ttl = ttl
+        self.max_size = max_size
+        self._loop = loop
+        self._sweep_handle = None
+        # Number of messages removed by the cache
+        self.expired = 0
+        self.evicted = 0
+        self.rejected = 0
+        # Size of each message in memory (when it was last updated)
+        self._sizes = {}
+        self._nbytes = 0
+
+    @property
+    def nbytes(self):
+        """Return the size of the messages in memory."""
+        return self._nbytes
+
+    def __delitem__(self, key):
+        """Remove a message."""
+        super().__delitem__(key)
+        self._nbytes -= self._sizes.pop(key, 0)
+
+    def pop(self, key, *default):
+        """Remove a message and return it."""
+        if key not in self:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        buffer = self[key]
+        del self[key]
+        return buffer
+
+    def create(self, key, size=None, spill=False, spill_dir=None, decoder=None):
+        """Create a message, evicting other messages if needed."""
+        self.remove_expired()
+        if self.max_size and size is not None and not spill and size > self.max_size:
+            self.rejected += 1
+            raise ValueError(
+                f"Message size ({size}) exceeds the message cache size "
+                f"({self.max_size})"
+            )
+        self.pop(key, None)
+        self[key] = MessageBuffer(
+            size, spill=spill, spill_dir=spill_dir, ttl=self.ttl, decoder=decoder
+        )
+        self._update(key)
+        self._evict(key)
+        self._schedule_sweep()
+        return self[key]
+
+    def touch(self, key):
+        """Return a message to update, as the most recently updated."""
+        self.remove_expired()
+        if key not in self:
+            raise KeyError(f"Message with key {key} does not exists.")
+        self.move_to_end(key)
+        return self[key]
+
+    def enforce_size(self, key):
+        """Evict other messages if needed after a message was updated."""
+        if key not in self:
+            return
+        self._update(key)
+        if self.max_size and self._sizes[key] > self.max_size:
+            del self[key]
+            self.rejected += 1
+            raise ValueError(
+                f"Message {key} exceeds the message cache size ({self.max_size})"
+            )
+        self._evict(key)
+
+    def remove_expired(self):
+        """Remove the messages which were not updated within their TTL."""
+        now = time.monotonic()
+        for key in [key for key, buffer in self.items() if buffer.expired(now)]:
+            logger.info("Removing expired message %s", key)
+            del self[key]
+            self.expired += 1
+
+    def close(self):
+        """Stop removing the expired messages periodically."""
+        if self._sweep_handle:
+            self._sweep_handle.cancel()
+            self._sweep_handle = None
+
+    def _schedule_sweep(self):
+        """Remove the expired messages after `ttl` seconds, if not scheduled."""
+        if self.ttl and self._loop and self._sweep_handle is None:
+            self._sweep_handle = self._loop.call_later(self.ttl, self._sweep)
+
+    def _sweep(self):
+        """Remove the expired messages, again later while the cache is not empty."""
+        self._sweep_handle = None
+        self.remove_expired()
+        if self:
+            self._schedule_sweep()
+
+    def _update(self, key):
+        """Update the size of a message in the total size."""
+        size = self[key].nbytes
+        self._nbytes += size - self._sizes.get(key, 0)
+        self._sizes[key] = size
+
+    def _evict(self, keep):
+        """Evict the least recently updated messages, except `keep`."""
+        if not self.max_size:
+            return
+        for key in list(self):
+            if self._nbytes <= self.max_size:
+                break
+            if key != keep and self._sizes.get(key):
+                logger.info("Evicting message %s from the message cache", key)
+                del self[key]
+                self.evicted += 1
+
+
+class PeerCache(OrderedDict):
+    """Keep a state (e.g. negotiated with the peer) for the recent peers.
+
+    The least recently set states are removed beyond `max_size` peers,
+    they are negotiated again when needed.
+    """
+
+    def __init__(self, max_size=PEER_CACHE_SIZE):
+        """Set up the cache."""
+        super().__init__()
+        self.max_size = max_size
+
+    def __setitem__(self, key, value):
+        """Set the state of a peer."""
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.max_size:
+            self.popitem(last=False)
+
+
+class ChunkStore:
+    """Keep the recently received chunks by their hash, up to a total size."""
+
+    def __init__(self, max_size):
+        """Set up the store."""
+        self.max_size = max_size
+        self.size = 0
+        self._chunks = OrderedDict()
+
+    def get(self, chunk_hash):
+        """Return the chunk with the hash, or None."""
+        chunk = self._chunks.get(chunk_hash)
+        if chunk is not None:
+            self._chunks.move_to_end(chunk_hash)
+        return chunk
+
+    def put(self, data):
+        """Store a chunk, evicting the least recently used ones."""
+        if len(data) > self.max_size:
+            return
+        chunk_hash = _hash_chunk(data)
+        if chunk_hash in self._chunks:
+            self._chunks.move_to_end(chunk_hash)
+            return
+        self._chunks[chunk_hash] = data
+        self.size += len(data)
+        while self.size > self.max_size:
+            _, chunk = self._chunks.popitem(last=False)
+            self.size -= len(chunk)
+
+
+class ChunkSizeController:
+    """Adapt the size of the chunks sent to a target to the link.
+
+    The chunk size follows the measured throughput, so that a chunk is sent
+    in about `CHUNK_TARGET_TIME` and the chunks in flight cover the
+    round-trip time, within the size bounds.
+    """
+
+    def __init__(self, chunk_size, min_size, max_size):
+        """Set up the controller."""
+        self.min_size = min_size
+        self.max_size = max_size
+        self.chunk_size = min(max(chunk_size, min_size), max_size)
+        self.rtt = None
+        self.throughput = None
+
+    def update(self, rtt, throughput, window=1):
+        """Update the chunk size with a round-trip time and a throughput.
+
+        `rtt` is the time (in seconds) until a chunk was acknowledged and
+        `throughput` the bytes acknowledged per second, with `window`
+        chunks in flight.
+        """
+        if self.rtt is None:
+            self.rtt, self.throughput = rtt, throughput
+        else:
+            self.rtt = 0.8 * self.rtt + 0.2 * rtt
+            self.throughput = 0.8 * self.throughput + 0.2 * throughput
+        target = self.throughput * max(CHUNK_TARGET_TIME, self.rtt / window)
+        # Change the chunk size by a factor of 2 at most
+        target = min(max(target, self.chunk_size / 2), self.chunk_size * 2)
+        self.chunk_size = int(min(max(target, self.min_size), self.max_size))
+
+
 class Timer:
     """Represent a timer."""
 
@@ -141,12 +822,97 @@ class RPC(MessageEmitter):
         name=None,
         codecs=None,
         method_timeout=None,
-        max_message_buffer_size=0,
+        max_message_buffer_size=MAX_MESSAGE_BUFFER_SIZE,
+        max_frame_size=MAX_FRAME_SIZE,
         loop=None,
         workspace=None,
+        oob_buffers=False,
+        zero_copy=False,
+        compression=None,
+        compression_threshold=COMPRESSION_THRESHOLD,
+        ndarray_compression=None,
+        ndarray_compression_threshold=NDARRAY_COMPRESSION_THRESHOLD,
+        dedup_objects=False,
+        chunk_window=CHUNK_WINDOW,
+        message_spill_threshold=None,
+        message_spill_dir=None,
+        message_cache_ttl=MESSAGE_CACHE_TTL,
+        message_cache_size=MESSAGE_CACHE_SIZE,
+        chunk_dedup=False,
+        chunk_store_size=0,
+        chunk_size=None,
+        max_chunk_size=MAX_CHUNK_SIZE,
+        batch_window=None,
     ):
         """Set up instance."""
-        self._codecs = codecs or {}
+        if not isinstance(codecs, CodecRegistry):
+            codecs = CodecRegistry(codecs or {})
+        self._codecs = codecs
+        # Send large binary payloads as out-of-band buffers to the target
+        # peers which support it (see `_get_encoding`)
+        self._oob_buffers = oob_buffers
+        # Pack the large binary payloads of the calls with a result without
+        # copying them, the payloads must not be modified until the result
+        self._zero_copy = zero_copy
+        # Compress messages with the first codec supported by the target peer,
+        # `True` for any of the available codecs
+        if compression is True:
+            self._compression = list(COMPRESSION_CODECS)
+        elif compression:
+            if compression not in COMPRESSION_CODECS:
+                raise ValueError(f"Unsupported compression: {compression}")
+            self._compression = [compression]
+        else:
+            self._compression = []
+        self._compression_threshold = compression_threshold
+        # Compress the bytes of large ndarrays, after a byte shuffle,
+        # for the target peers which support the codec
+        if ndarray_compression is True:
+            ndarray_compression = next(iter(COMPRESSION_CODECS))
+        if ndarray_compression and ndarray_compression not in COMPRESSION_CODECS:
+            raise ValueError(f"Unsupported compression: {ndarray_compression}")
+        self._ndarray_compression = ndarray_compression
+        self._ndarray_compression_threshold = ndarray_compression_threshold
+        # Encode the binary objects repeated in one payload as references,
+        # for the target peers which support it
+        self._dedup_objects = dedup_objects
+        # Send the chunks of long messages without waiting for each of them,
+        # with at most `chunk_window` chunks in flight
+        self._chunk_window = max(int(chunk_window), 1)
+        # Receive the chunked messages above the threshold (in bytes) into
+        # memory-mapped temporary files instead of memory
+        self._message_spill_threshold = message_spill_threshold
+        self._message_spill_dir = message_spill_dir
+        # Keep the incomplete messages for resuming their upload, e.g. after
+        # a reconnection, until they are not updated for `message_cache_ttl`
+        self._message_cache_ttl = message_cache_ttl
+        # Limit the size (in bytes) of the incomplete messages in memory,
+        # None for no limit
+        self._message_cache_size = message_cache_size
+        # Skip sending the chunks of long messages which the target peer
+        # already has in its chunk store (i.e. received recently)
+        self._chunk_dedup = chunk_dedup
+        # Keep the received chunks (up to `chunk_store_size` bytes) for the
+        # peers which send the same data again
+        self._chunk_store = ChunkStore(chunk_store_size) if chunk_store_size else None
+        # Split the long messages into chunks of `chunk_size` bytes if set,
+        # otherwise the chunk size is adapted to the link with each target,
+        # up to `max_chunk_size` (and the frame size of the target)
+        self._chunk_size = chunk_size
+        self._max_chunk_size = max_chunk_size
+        self._chunk_controllers = PeerCache()
+        # The negotiated compression codec for each target (None if unsupported)
+        self._peer_compression = PeerCache()
+        # Send the small messages to a target within `batch_window` seconds
+        # (0 for the same event loop iteration) in one frame, if supported
+        self._batch_window = batch_window
+        # Whether each target supports batch messages
+        self._peer_batch = PeerCache()
+        # The payload encodings (out-of-band buffers, object references and
+        # ndarray compression) negotiated with each target
+        self._peer_encoding = PeerCache()
+        # The pending batch of each target
+        self._batches = {}
         assert client_id and isinstance(client_id, str)
         assert client_id is not None, "client_id is required"
         self._client_id = client_id
@@ -157,9 +923,16 @@ class RPC(MessageEmitter):
         self.manager_id = manager_id
         self.default_context = default_context or {}
         self._method_annotations = weakref.WeakKeyDictionary()
+        # Reuse the remote methods of services, in LRU order
+        self._remote_method_cache = OrderedDict()
         self._manager_service = None
+        # Maximum size of the received messages (0 for no limit), the larger
+        # ones are rejected when they are created with their size
         self._max_message_buffer_size = max_message_buffer_size
-        self._chunk_store = {}
+        # Maximum size of the received frames (i.e. messages which are not chunked)
+        self._max_frame_size = max_frame_size
+        self._unpacker = self._create_unpacker()
+        self._packer = msgpack.Packer()
         self._method_timeout = 30 if method_timeout is None else method_timeout
         self._remote_logger = logger
         self.loop = loop or asyncio.get_event_loop()
@@ -171,6 +944,19 @@ class RPC(MessageEmitter):
         }
 
         if connection:
+            message_cache = {
+                "create": self._create_message,
+                "append": self._append_message,
+                "process": self._process_message,
+                "remove": self._remove_message,
+                "offset": self._get_message_offset,
+                # the chunks can be appended out of order with an index
+                "indexed": True,
+                # the message size can be declared, to append at offsets
+                "sized": True,
+            }
+            if self._chunk_store:
+                message_cache["append_cached"] = self._append_cached_chunks
             self.add_service(
                 {
                     "id": "built-in",
@@ -180,12 +966,15 @@ class RPC(MessageEmitter):
                     "ping": self._ping,
                     "get_service": self.get_local_service,
                     "register_service": self.register_service,
-                    "message_cache": {
-                        "create": self._create_message,
-                        "append": self._append_message,
-                        "process": self._process_message,
-                        "remove": self._remove_message,
-                    },
+                    "compression": list(COMPRESSION_CODECS),
+                    "max_frame_size": self._max_frame_size,
+                    # several messages can be sent in one batch message
+                    "batch": True,
+                    # the payload encodings which can be decoded
+                    "oob_buffers": True,
+                    "dedup_objects": True,
+                    "ndarray_compression": list(COMPRESSION_CODECS),
+                    "message_cache": message_cache,
                 }
             )
             self.on("method", self._handle_method)
@@ -264,6 +1053,10 @@ class RPC(MessageEmitter):
 
         self._codecs[config["name"]] = dotdict(config)
 
+    def _find_codec(self, a_object):
+        """Find the encoder codec for an object."""
+        return self._codecs.find_encoder(type(a_object))
+
     async def _ping(self, msg, context=None):
         """Handle ping."""
         assert msg == "ping"
@@ -282,35 +1075,108 @@ class RPC(MessageEmitter):
         )
         assert (await asyncio.wait_for(method("ping"), timeout)) == "pong"
 
-    def _create_message(self, key, heartbeat=False, overwrite=False, context=None):
-        """Create a message."""
+    def _create_message(
+        self, key, heartbeat=False, overwrite=False, size=None, context=None
+    ):
+        """Create a message, optionally with its total size in bytes."""
         if heartbeat:
             if key not in self._object_store:
                 raise Exception(f"session does not exist anymore: {key}")
             self._object_store[key]["timer"].reset()
 
         if "message_cache" not in self._object_store:
-            self._object_store["message_cache"] = {}
-        if not overwrite and key in self._object_store["message_cache"]:
+            self._object_store["message_cache"] = MessageCache(
+                ttl=self._message_cache_ttl,
+                max_size=self._message_cache_size,
+                loop=self.loop,
+            )
+        cache = self._object_store["message_cache"]
+        cache.remove_expired()
+        if not overwrite and key in cache:
             raise Exception(
                 "Message with the same key (%s) already exists in the cache store, "
                 "please use overwrite=True or remove it first.",
                 key,
             )
 
-        self._object_store["message_cache"][key] = b""
+        spill = (
+            size is not None
+            and self._message_spill_threshold is not None
+            and size >= self._message_spill_threshold
+        )
+        # Note: the spilled messages are not kept in memory, i.e. not limited
+        if size is not None and self._max_message_buffer_size and not spill:
+            if size > self._max_message_buffer_size:
+                raise ValueError(
+                    f"Message size ({size}) exceeds the limit "
+                    f"({self._max_message_buffer_size})"
+                )
+        # Decode the messages with a declared size as their chunks arrive
+        decoder = None
+        if size is not None:
+            decoder = MessageDecoder(
+                self._max_frame_size, self._max_message_buffer_size
+            )
+        cache.create(
+            key, size, spill=spill, spill_dir=self._message_spill_dir, decoder=decoder
+        )
+
+    def _append_message(
+        self,
+        key,
+        data,
+        heartbeat=False,
+        index=None,
+        offset=None,
+        store=False,
+        context=None,
+    ):
+        """Append a message.
 
-    def _append_message(self, key, data, heartbeat=False, context=None):
-        """Append a message."""
+        The chunk is stored at `index` (its position in the chunks) or `offset`
+        (its position in bytes, with a declared size) if given, i.e. the chunks
+        can arrive in any order, otherwise it is appended after the last chunk.
+        With `store`, the chunk is also kept in the chunk store.
+        """
         if heartbeat:
             if key not in self._object_store:
                 raise Exception(f"session does not exist anymore: {key}")
             self._object_store[key]["timer"].reset()
         cache = self._object_store["message_cache"]
-        if key not in cache:
-            raise KeyError(f"Message with key {key} does not exists.")
         assert isinstance(data, bytes)
-        cache[key] += data
+        cache.touch(key).append(data, index=index, offset=offset)
+        cache.enforce_size(key)
+        if store and self._chunk_store:
+            self._chunk_store.put(data)
+
+    def _append_cached_chunks(
+        self, key, hashes, offsets, heartbeat=False, context=None
+    ):
+        """Append the chunks of the chunk store to a message at the offsets.
+
+        Return whether each chunk was found in the store.
+        """
+        if heartbeat:
+            if key not in self._object_store:
+                raise Exception(f"session does not exist anymore: {key}")
+            self._object_store[key]["timer"].reset()
+        cache = self._object_store["message_cache"]
+        buffer = cache.touch(key)
+        found = []
+        for chunk_hash, offset in zip(hashes, offsets):
+            chunk = self._chunk_store.get(chunk_hash) if self._chunk_store else None
+            if chunk is not None:
+                buffer.append(chunk, offset=offset)
+            found.append(chunk is not None)
+        cache.enforce_size(key)
+        return found
+
+    def _get_message_offset(self, key, context=None):
+        """Return the size of the data received from the start of a message."""
+        cache = self._object_store.get("message_cache")
+        if cache is None:
+            raise KeyError(f"Message with key {key} does not exists.")
+        return cache.touch(key).committed()
 
     def _remove_message(self, key, context=None):
         """Remove a message."""
@@ -327,13 +1193,22 @@ class RPC(MessageEmitter):
             self._object_store[key]["timer"].reset()
         cache = self._object_store["message_cache"]
         assert context is not None, "Context is required"
-        if key not in cache:
-            raise KeyError(f"Message with key {key} does not exists.")
-        logger.debug("Processing message %s (size=%d)", key, len(cache[key]))
-        unpacker = msgpack.Unpacker(
-            io.BytesIO(cache[key]), max_buffer_size=self._max_message_buffer_size
-        )
-        main = unpacker.unpack()
+        # Note: the message is unpacked from the buffer without a copy
+        buffer = cache.touch(key)
+        message = buffer.getbuffer()
+        logger.debug("Processing message %s (size=%d)", key, len(message))
+        decoder = buffer.decoded()
+        limit = 0 if buffer.spilled else self._max_message_buffer_size
+        if decoder is not None and not (limit and len(message) > limit):
+            # The main message was decoded as the chunks arrived
+            main = decoder.main
+            if decoder.compression:
+                view = decoder.decompressed()
+            else:
+                view = message[decoder.offset :]
+            extra = self._unpack_extra(view, decoder.buffer_sizes)
+        else:
+            main, extra = self._unpack_message(message, limit)
         # Make sure the fields are from trusted source
         main.update(
             {
@@ -342,29 +1217,147 @@ class RPC(MessageEmitter):
                 "user": context["user"],
             }
         )
-        main["ctx"] = main.copy()
-        main["ctx"].update(self.default_context)
-        try:
-            extra = unpacker.unpack()
-            main.update(extra)
-        except msgpack.exceptions.OutOfData:
-            pass
-        self._fire(main["type"], main)
+        self._dispatch_message(main, extra)
         del cache[key]
 
+    def _create_unpacker(self):
+        """Create the unpacker for the main messages of the received frames."""
+        return msgpack.Unpacker(max_buffer_size=self._max_frame_size)
+
+    def _unpack_message(self, message, max_buffer_size=0):
+        """Unpack the main message and the extra data of a message package.
+
+        The package consists of the main message, optionally followed by
+        the out-of-band buffers listed in `main["buffers"]`, and the extra data.
+        If `main["compression"]` is set, everything after the main message
+        is compressed with the given codec.
+        """
+        if max_buffer_size and len(message) > max_buffer_size:
+            raise ValueError(
+                f"Message size ({len(message)}) exceeds the limit ({max_buffer_size})"
+            )
+        # The unpacker is reused for all the messages, only the beginning of
+        # large messages is fed to it, the rest is unpacked from the view
+        unpacker = self._unpacker
+        if len(message) > self._max_frame_size:
+            # The main message can be larger than the unpacker buffer, e.g.
+            # with the payload of peers which do not send it as extra data
+            unpacker = msgpack.Unpacker(max_buffer_size=len(message))
+        start = unpacker.tell()
+        try:
+            if len(message) <= UNPACKER_FEED_SIZE:
+                unpacker.feed(message)
+                fed = len(message)
+                main = unpacker.unpack()
+            else:
+                view = memoryview(message)
+                fed = 0
+                while True:
+                    size = max(fed, UNPACKER_FEED_SIZE)
+                    unpacker.feed(view[fed : fed + size])
+                    fed = min(fed + size, len(view))
+                    try:
+                        main = unpacker.unpack()
+                        break
+                    except msgpack.exceptions.OutOfData:
+                        if fed >= len(view):
+                            raise
+            offset = unpacker.tell() - start
+            compression, buffer_sizes = _package_format(main)
+            # The message was fed completely and contains only msgpack data
+            unpack_extra = not compression and not buffer_sizes and fed == len(message)
+            extra = None
+            if unpack_extra and offset < fed:
+                extra = unpacker.unpack()
+                offset = unpacker.tell() - start
+            # Discard the remaining fed data
+            if offset < fed:
+                unpacker.read_bytes(fed - offset)
+        except Exception:
+            if unpacker is self._unpacker:
+                self._unpacker = self._create_unpacker()
+            raise
+        if unpack_extra:
+            return main, extra
+        view = memoryview(message)[offset:]
+        if compression:
+            view = memoryview(
+                _decompress(compression, view, self._max_message_buffer_size)
+            )
+        return main, self._unpack_extra(view, buffer_sizes)
+
+    def _unpack_extra(self, view, buffer_sizes):
+        """Unpack the (decompressed) out-of-band buffers and extra data."""
+        offset = 0
+        buffers = []
+        for size in buffer_sizes or []:
+            buffers.append(view[offset : offset + size])
+            offset += size
+        if offset >= len(view):
+            return None
+        return msgpack.unpackb(
+            view[offset:],
+            ext_hook=partial(_resolve_buffer, buffers),
+        )
+
     def _on_message(self, message):
         """Handle message."""
         assert isinstance(message, bytes)
-        unpacker = msgpack.Unpacker(io.BytesIO(message), max_buffer_size=CHUNK_SIZE * 2)
-        main = unpacker.unpack()
+        # Drop the frames which fail (e.g. too large or invalid), without
+        # stopping the handling of the next ones
+        try:
+            self._handle_frame(message)
+        except Exception as exp:  # pylint: disable=broad-except
+            logger.exception(
+                "Dropped a message (%d bytes) which failed: %s", len(message), exp
+            )
+
+    def _handle_frame(self, message):
+        """Unpack and dispatch the message(s) of a frame."""
+        main, extra = self._unpack_message(message, self._max_frame_size)
+        if main["type"] == "batch":
+            self._record_compression(main)
+            for packed in extra["messages"]:
+                # Handle the other messages if one of them fails
+                try:
+                    message_main, message_extra = self._unpack_message(
+                        packed, self._max_frame_size
+                    )
+                    # Only the routing fields of the batch message are trusted
+                    for key in ("from", "to", "user"):
+                        if key in main:
+                            message_main[key] = main[key]
+                        else:
+                            message_main.pop(key, None)
+                    self._dispatch_message(message_main, message_extra)
+                except Exception as exp:  # pylint: disable=broad-except
+                    logger.exception(
+                        "Failed to handle a batched message from %s: %s",
+                        main.get("from"),
+                        exp,
+                    )
+            return
+        self._dispatch_message(main, extra)
+
+    def _record_compression(self, main):
+        """Record the compression of a message with trusted routing fields."""
+        compression = main.pop("compression", None)
+        if compression:
+            # The sender can decompress our messages too
+            sender = main.get("from")
+            if compression in self._compression and not self._peer_compression.get(
+                sender
+            ):
+                self._peer_compression[sender] = compression
+
+    def _dispatch_message(self, main, extra):
+        """Fire the event of a received message (with trusted routing fields)."""
+        self._record_compression(main)
         # Add trusted context to the method call
         main["ctx"] = main.copy()
         main["ctx"].update(self.default_context)
-        try:
-            extra = unpacker.unpack()
+        if extra:
             main.update(extra)
-        except msgpack.exceptions.OutOfData:
-            pass
         self._fire(main["type"], main)
 
     def reset(self):
@@ -377,6 +1370,8 @@ class RPC(MessageEmitter):
         if self._get_connection_info_task:
             self._get_connection_info_task.cancel()
             self._get_connection_info_task = None
+        if "message_cache" in self._object_store:
+            self._object_store["message_cache"].close()
         self._fire("disconnect")
 
     async def get_manager_service(self, timeout=None):
@@ -599,6 +1594,21 @@ class RPC(MessageEmitter):
             logger.warning(
                 "Failed to import numpy, ndarray encoding/decoding will not work"
             )
+        if self.NUMPY_MODULE:
+            try:
+                import pandas as pd
+
+                # Do not replace the codecs passed in by the user
+                if not any(c.type is pd.DataFrame for c in self._codecs.values()):
+                    self.register_codec(get_dataframe_codec(self.NUMPY_MODULE, pd))
+            except ImportError:
+                pass
+            try:
+                from scipy import sparse
+
+                self.register_codec(get_sparse_codec(sparse))
+            except ImportError:
+                pass
 
     def _encode_callback(
         self,
@@ -688,36 +1698,435 @@ class RPC(MessageEmitter):
         ), "Remote client does not support message caching for long message."
         message_cache = remote_services.message_cache
         message_id = session_id or shortuuid.uuid()
-        await message_cache.create(message_id, bool(session_id))
-        total_size = len(package)
-        chunk_num = int(math.ceil(float(total_size) / CHUNK_SIZE))
-        for idx in range(chunk_num):
-            start_byte = idx * CHUNK_SIZE
-            await message_cache.append(
-                message_id,
-                package[start_byte : start_byte + CHUNK_SIZE],
-                bool(session_id),
-            )
-            logger.info(
-                "Sending chunk %d/%d (%d bytes)",
-                idx + 1,
-                chunk_num,
-                total_size,
+        if isinstance(package, (list, tuple)):
+            total_size = sum(len(memoryview(buffer)) for buffer in package)
+        else:
+            total_size = len(package)
+        # Let the remote client preallocate the message if supported
+        sized = message_cache.get("sized")
+        if sized:
+            await message_cache.create(message_id, bool(session_id), size=total_size)
+        else:
+            await message_cache.create(message_id, bool(session_id))
+        # Continue from the bytes received by the remote client if the
+        # upload fails, e.g. when the connection is lost
+        resumable = sized and message_cache.get("offset")
+        # Skip the chunks which the remote client has in its chunk store
+        cached = None
+        if self._chunk_dedup and sized and message_cache.get("append_cached"):
+            cached = await self._send_cached_chunks(
+                message_cache, message_id, package, session_id
             )
-        logger.info("All chunks sent (%d)", chunk_num)
+        offset = 0
+        attempt = 0
+        while True:
+            try:
+                if attempt:
+                    await asyncio.sleep(CHUNK_RESUME_DELAY)
+                    committed = await message_cache.offset(message_id)
+                    if committed > offset:
+                        # Count the attempts since the last progress
+                        attempt = 0
+                    offset = committed
+                    logger.info(
+                        "Resuming message %s at %d/%d bytes",
+                        message_id,
+                        offset,
+                        total_size,
+                    )
+                await self._append_chunks(
+                    message_cache,
+                    message_id,
+                    package,
+                    total_size,
+                    session_id,
+                    offset,
+                    cached,
+                    self._get_chunk_controller(target_id, remote_services),
+                )
+                break
+            except Exception as exp:  # pylint: disable=broad-except
+                attempt += 1
+                # Only retry if sending failed (e.g. the connection was lost)
+                # or timed out, not if the remote client rejected the chunks
+                # (e.g. the message exceeds its limits or was evicted)
+                if (
+                    not resumable
+                    or isinstance(exp, RemoteException)
+                    or attempt > CHUNK_RESUME_RETRIES
+                ):
+                    raise
+                logger.warning(
+                    "Failed to send message %s (%s), retrying %d/%d",
+                    message_id,
+                    exp,
+                    attempt,
+                    CHUNK_RESUME_RETRIES,
+                )
         await message_cache.process(message_id, bool(session_id))
 
+    async def _send_cached_chunks(self, message_cache, message_id, package, session_id):
+        """Append the chunks from the chunk store of the remote client.
+
+        Return the offsets of the chunks found in the store.
+        """
+        hashes, offsets = [], []
+        offset = 0
+        for chunk in _iter_chunks(package, CHUNK_SIZE, aligned=True):
+            hashes.append(_hash_chunk(chunk))
+            offsets.append(offset)
+            offset += len(chunk)
+        found = await message_cache.append_cached(
+            message_id, hashes, offsets, bool(session_id)
+        )
+        cached = {offset for offset, exists in zip(offsets, found) if exists}
+        logger.info(
+            "Found %d/%d chunks of message %s in the chunk store",
+            len(cached),
+            len(offsets),
+            message_id,
+        )
+        return cached
+
+    async def _append_chunks(
+        self,
+        message_cache,
+        message_id,
+        package,
+        total_size,
+        session_id,
+        offset=0,
+        cached=None,
+        controller=None,
+    ):
+        """Append the chunks of a message package from the offset (in bytes).
+
+        If `cached` is a set of offsets, the chunks are aligned to the buffers
+        of the package, the chunks at these offsets are skipped and the other
+        ones are kept in the chunk store of the remote client. Otherwise the
+        chunk size is adapted by the `controller` (if any) as the chunks are sent.
+        """
+        sized = message_cache.get("sized")
+        # Keep several chunks in flight if the remote client can reorder them
+        window = self._chunk_window if message_cache.get("indexed") else 1
+        if cached is not None:
+            # The same data must be split into the same chunks
+            chunk_size, controller = CHUNK_SIZE, None
+        elif controller:
+            chunk_size = partial(getattr, controller, "chunk_size")
+        else:
+            chunk_size = CHUNK_SIZE
+        pending = {}
+        started, acked = time.monotonic(), 0
+
+        def acknowledge(task):
+            nonlocal acked
+            sent, size = pending.pop(task)
+            acked += size
+            if controller:
+                now = time.monotonic()
+                controller.update(now - sent, acked / (now - started), window)
+
+        chunks = _iter_chunks(package, chunk_size, offset, aligned=cached is not None)
+        try:
+            for idx, chunk in enumerate(chunks):
+                if cached is not None:
+                    if offset in cached:
+                        offset += len(chunk)
+                        continue
+                    position = {"offset": offset, "store": True}
+                elif sized:
+                    position = {"offset": offset}
+                elif window > 1:
+                    position = {"index": idx}
+                else:
+                    position = {}
+                offset += len(chunk)
+                if len(pending) >= window:
+                    done, _ = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    errors = [task.exception() for task in done]
+                    if any(errors):
+                        raise next(error for error in errors if error)
+                    for task in done:
+                        acknowledge(task)
+                task = asyncio.ensure_future(
+                    message_cache.append(
+                        message_id, chunk, bool(session_id), **position
+                    )
+                )
+                pending[task] = (time.monotonic(), len(chunk))
+                if window == 1:
+                    await task
+                    acknowledge(task)
+                logger.info(
+                    "Sending chunk %d (%d/%d bytes)", idx + 1, offset, total_size
+                )
+            if pending:
+                await asyncio.gather(*pending)
+        except BaseException:
+            for task in pending:
+                # Note: the errors of the finished appends are ignored
+                if not task.cancel() and not task.cancelled():
+                    task.exception()
+            raise
+        logger.info("All chunks sent (%d bytes)", total_size)
+
+    def _get_max_message_size(self, target_id):
+        """Return the size of the largest message sent to a target in one frame."""
+        controller = self._chunk_controllers.get(target_id)
+        max_size = controller.max_size if controller else CHUNK_SIZE
+        # Note: the maximum chunk size leaves room in the frames of the target
+        # for the routing fields, see `_get_chunk_controller`
+        return max_size + CHUNK_MESSAGE_HEADER
+
+    def _get_chunk_controller(self, target_id, remote_services):
+        """Return the chunk size controller of a target."""
+        controller = self._chunk_controllers.get(target_id)
+        if controller is None:
+            # The chunks (with the message header) must fit in the frames
+            # accepted by the target
+            max_frame_size = remote_services.get("max_frame_size")
+            if max_frame_size:
+                max_size = min(
+                    self._max_chunk_size, max_frame_size - CHUNK_MESSAGE_OVERHEAD
+                )
+            else:
+                max_size = CHUNK_SIZE
+            if self._chunk_size:
+                # A fixed chunk size
+                size = min(self._chunk_size, max_size)
+                controller = ChunkSizeController(size, size, size)
+            else:
+                controller = ChunkSizeController(CHUNK_SIZE, MIN_CHUNK_SIZE, max_size)
+            self._chunk_controllers[target_id] = controller
+        return controller
+
+    def _get_compression(self, target_id):
+        """Return the compression codec negotiated with the target."""
+        if not self._compression or not target_id:
+            return None
+        if target_id in self._peer_compression:
+            return self._peer_compression[target_id]
+        # Send uncompressed messages until the target supports compression
+        self._peer_compression[target_id] = None
+        if self.manager_id and target_id.split("/")[-1] == self.manager_id:
+            return None
+        self.loop.create_task(self._negotiate_compression(target_id))
+        return None
+
+    async def _negotiate_compression(self, target_id):
+        """Query the compression codecs supported by the target."""
+        try:
+            remote_services = await self.get_remote_service(f"{target_id}:built-in")
+        except Exception as exp:  # pylint: disable=broad-except
+            logger.debug("Failed to negotiate compression with %s: %s", target_id, exp)
+            return
+        supported = remote_services.get("compression") or []
+        for compression in self._compression:
+            if compression in supported:
+                self._peer_compression[target_id] = compression
+                break
+
+    def _supports_batch(self, target_id):
+        """Check if the target is known to support batch messages."""
+        if target_id in self._peer_batch:
+            return self._peer_batch[target_id]
+        # Send the messages one by one until the target supports batches
+        self._peer_batch[target_id] = False
+        if self.manager_id and target_id.split("/")[-1] == self.manager_id:
+            return False
+        self.loop.create_task(self._negotiate_batch(target_id))
+        return False
+
+    async def _negotiate_batch(self, target_id):
+        """Query whether the target supports batch messages."""
+        try:
+            remote_services = await self.get_remote_service(f"{target_id}:built-in")
+        except Exception as exp:  # pylint: disable=broad-except
+            logger.debug("Failed to negotiate batches with %s: %s", target_id, exp)
+            return
+        self._peer_batch[target_id] = bool(remote_services.get("batch"))
+
+    def _get_encoding(self, target_id):
+        """Return the payload encodings negotiated with the target."""
+        encoding = {
+            "oob_buffers": False,
+            "dedup_objects": False,
+            "ndarray_compression": None,
+        }
+        if not (self._oob_buffers or self._dedup_objects or self._ndarray_compression):
+            return encoding
+        if target_id in self._peer_encoding:
+            return self._peer_encoding[target_id]
+        # Encode the payloads without them until the target supports them
+        self._peer_encoding[target_id] = encoding
+        if self.manager_id and target_id.split("/")[-1] == self.manager_id:
+            return encoding
+        self.loop.create_task(self._negotiate_encoding(target_id))
+        return encoding
+
+    async def _negotiate_encoding(self, target_id):
+        """Query the payload encodings supported by the target."""
+        try:
+            remote_services = await self.get_remote_service(f"{target_id}:built-in")
+        except Exception as exp:  # pylint: disable=broad-except
+            logger.debug("Failed to negotiate encodings with %s: %s", target_id, exp)
+            return
+        supported = remote_services.get("ndarray_compression") or []
+        self._peer_encoding[target_id] = {
+            "oob_buffers": self._oob_buffers
+            and bool(remote_services.get("oob_buffers")),
+            "dedup_objects": self._dedup_objects
+            and bool(remote_services.get("dedup_objects")),
+            "ndarray_compression": self._ndarray_compression
+            if self._ndarray_compression in supported
+            else None,
+        }
+
+    def _send_message(self, package, target_id):
+        """Send a message in one frame, return a future.
+
+        With a batch window, the small messages to the same target are
+        collected and sent together in a batch message.
+        """
+        # Note: small messages are packed into bytes, larger ones into a list
+        if (
+            self._batch_window is None
+            or not isinstance(package, bytes)
+            or not self._supports_batch(target_id)
+        ):
+            # Keep the order of the messages to the target
+            self._flush_batch(target_id)
+            return asyncio.ensure_future(self._emit_message(package))
+        batch = self._batches.get(target_id)
+        if batch is not None and batch["size"] + len(package) > CHUNK_SIZE:
+            self._flush_batch(target_id)
+            batch = None
+        if batch is None:
+            batch = {"messages": [], "size": 0, "future": self.loop.create_future()}
+            self._batches[target_id] = batch
+            if self._batch_window:
+                self.loop.call_later(
+                    self._batch_window, self._flush_batch, target_id, batch
+                )
+            else:
+                self.loop.call_soon(self._flush_batch, target_id, batch)
+        batch["messages"].append(package)
+        batch["size"] += len(package)
+        return batch["future"]
+
+    def _flush_batch(self, target_id, batch=None):
+        """Send the pending batch of a target (if any, or `batch` only)."""
+        pending = self._batches.get(target_id)
+        if pending is None or (batch is not None and pending is not batch):
+            # Already sent
+            return
+        batch = self._batches.pop(target_id)
+        messages = batch["messages"]
+        future = batch["future"]
+        try:
+            if len(messages) == 1:
+                package = messages[0]
+            else:
+                package = self._pack_message(
+                    {
+                        "type": "batch",
+                        "from": self._local_workspace + "/" + self._client_id
+                        if self._local_workspace
+                        else self._client_id,
+                        "to": target_id,
+                    },
+                    {"messages": messages},
+                )
+        except Exception as exp:  # pylint: disable=broad-except
+            future.set_exception(exp)
+            return
+
+        def done(task):
+            if task.cancelled():
+                future.cancel()
+            elif task.exception():
+                future.set_exception(task.exception())
+            else:
+                future.set_result(None)
+
+        asyncio.ensure_future(self._emit_message(package)).add_done_callback(done)
+
+    def _pack(self, obj):
+        """Pack an object with the reused packer."""
+        data = self._packer.pack(obj)
+        if len(data) > CHUNK_SIZE:
+            # Release the (grown) buffer of the packer
+            self._packer = msgpack.Packer()
+        return data
+
+    def _pack_message(self, main_message, extra_data=None, buffers=None):
+        """Pack a message, return bytes or a list of buffers.
+
+        The message consists of two segments, the main message and extra data,
+        the out-of-band buffers are placed between the two segments.
+        The segments after the main message are compressed if the target
+        supports it. Large segments are returned in a list instead of
+        being copied into one buffer. With `InlineBuffers`, the buffers are
+        packed in the extra data instead, as views in the list.
+        """
+        inline = isinstance(buffers, InlineBuffers)
+        if buffers and inline:
+            data = _inline_buffers(self._pack(extra_data), buffers)
+        elif buffers:
+            main_message["buffers"] = [len(buffer) for buffer in buffers]
+            data = buffers + [self._pack(extra_data)]
+        else:
+            data = [self._pack(extra_data)] if extra_data else []
+        size = sum(len(buffer) for buffer in data)
+        compression = self._get_compression(main_message.get("to"))
+        if compression and size >= self._compression_threshold:
+            compressed = COMPRESSION_CODECS[compression][0](b"".join(data))
+            if len(compressed) < size:
+                main_message["compression"] = compression
+                data = [compressed]
+                size = len(compressed)
+        if (buffers and not inline) or size >= PACK_JOIN_SIZE:
+            return [self._pack(main_message)] + data
+        return b"".join([self._pack(main_message)] + data)
+
     def emit(self, main_message, extra_data=None):
-        """Emit a message."""
+        """Emit a message.
+
+        Large messages to a single client are sent in chunks, like method
+        calls.
+        """
         assert isinstance(main_message, dict) and "type" in main_message
-        message_package = msgpack.packb(main_message)
-        if extra_data:
-            message_package = message_package + msgpack.packb(extra_data)
-        total_size = len(message_package)
-        if total_size <= CHUNK_SIZE + 1024:
-            return self.loop.create_task(self._emit_message(message_package))
+        target_id = main_message.get("to")
+        if target_id and "/" not in target_id and self._local_workspace:
+            target_id = self._local_workspace + "/" + target_id
+        message_package = self._pack_message(main_message, extra_data)
+        if isinstance(message_package, list):
+            total_size = sum(len(buffer) for buffer in message_package)
         else:
-            raise Exception("Message is too large to send in one go.")
+            total_size = len(message_package)
+        # Keep the order of the messages to the target
+        self._flush_batch(target_id)
+        if total_size <= self._get_max_message_size(target_id):
+            return self.loop.create_task(self._emit_message(message_package))
+        if not target_id or "*" in target_id:
+            raise Exception("Message is too large to broadcast in one go.")
+        if extra_data is None:
+            # Move the payload out of the main message (which must fit in the
+            # unpacker buffer of the target), the target merges it back
+            # Note: the main message alone is not compressed, i.e. unchanged
+            message = dict(main_message)
+            main_message = {
+                key: message.pop(key)
+                for key in ("type", "to", "from")
+                if key in message
+            }
+            message_package = self._pack_message(main_message, message)
+        return self.loop.create_task(
+            self._send_chunks(message_package, target_id, None)
+        )
 
     def _generate_remote_method(
         self,
@@ -737,6 +2146,23 @@ class RPC(MessageEmitter):
         method_id = encoded_method["_rmethod"]
         with_promise = encoded_method.get("_rpromise", False)
 
+        # Methods of services do not depend on a session, so they can be reused
+        cache_key = None
+        if method_id.startswith("services.") and not remote_parent and not local_parent:
+            cache_key = (
+                target_id,
+                method_id,
+                remote_workspace,
+                local_workspace,
+                with_promise,
+                encoded_method.get("_rsig"),
+                encoded_method.get("_rdoc"),
+            )
+            cached_method = self._remote_method_cache.get(cache_key)
+            if cached_method is not None:
+                self._remote_method_cache.move_to_end(cache_key)
+                return cached_method
+
         def remote_method(*arguments, **kwargs):
             """Run remote method."""
             arguments = list(arguments)
@@ -756,10 +2182,24 @@ class RPC(MessageEmitter):
                     )
                     return
                 store["target_id"] = target_id
+                encoding = self._get_encoding(target_id)
+                # Note: with `zero_copy`, the large payloads are referenced and
+                # only copied chunk by chunk when sent, unless the caller does
+                # not wait for the call (no promise)
+                if encoding["oob_buffers"]:
+                    buffers = []
+                elif with_promise and self._zero_copy:
+                    buffers = InlineBuffers()
+                else:
+                    buffers = None
+                refs = ObjectRefs() if encoding["dedup_objects"] else None
                 args = self._encode(
                     arguments,
                     session_id=local_session_id,
                     local_workspace=local_workspace,
+                    buffers=buffers,
+                    refs=refs,
+                    ndarray_compression=encoding["ndarray_compression"],
                 )
 
                 main_message = {
@@ -772,7 +2212,7 @@ class RPC(MessageEmitter):
                 }
                 extra_data = {}
                 if args:
-                    extra_data["args"] = args
+                    extra_data["args"] = refs.wrap(args) if refs is not None else args
                 if kwargs:
                     extra_data["with_kwargs"] = bool(kwargs)
 
@@ -817,17 +2257,16 @@ class RPC(MessageEmitter):
                         timer=timer,
                         local_workspace=local_workspace,
                     )
-                # The message consists of two segments, the main message and extra data
-                message_package = msgpack.packb(main_message)
-                if extra_data:
-                    message_package = message_package + msgpack.packb(extra_data)
-                total_size = len(message_package)
-                if total_size <= CHUNK_SIZE + 1024:
-                    emit_task = asyncio.ensure_future(
-                        self._emit_message(message_package)
-                    )
+                message_package = self._pack_message(main_message, extra_data, buffers)
+                if isinstance(message_package, list):
+                    total_size = sum(len(buffer) for buffer in message_package)
+                else:
+                    total_size = len(message_package)
+                if total_size <= self._get_max_message_size(target_id):
+                    emit_task = self._send_message(message_package, target_id)
                 else:
-                    # send chunk by chunk
+                    # send chunk by chunk, after the pending batch
+                    self._flush_batch(target_id)
                     emit_task = asyncio.ensure_future(
                         self._send_chunks(message_package, target_id, remote_parent)
                     )
@@ -864,6 +2303,10 @@ class RPC(MessageEmitter):
             logger.warning(
                 "Failed to generate signature for method: %s, error: %s", method_id, exp
             )
+        if cache_key:
+            self._remote_method_cache[cache_key] = remote_method
+            if len(self._remote_method_cache) > REMOTE_METHOD_CACHE_SIZE:
+                self._remote_method_cache.popitem(last=False)
         return remote_method
 
     def _log(self, info):
@@ -1099,10 +2542,20 @@ class RPC(MessageEmitter):
 
     def encode(self, a_object, session_id=None):
         """Encode object."""
-        return self._encode(
+        refs = ObjectRefs() if self._dedup_objects else None
+        encoded = self._encode(
             a_object,
             session_id=session_id,
+            refs=refs,
+            ndarray_compression=self._ndarray_compression,
         )
+        return refs.wrap(encoded) if refs is not None else encoded
+
+    def _is_ref_candidate(self, value):
+        """Check if an object can be encoded as a reference when repeated."""
+        if isinstance(value, (bytes, memoryview)):
+            return len(value) >= OOB_MIN_SIZE
+        return bool(self.NUMPY_MODULE) and isinstance(value, self.NUMPY_MODULE.ndarray)
 
     def _get_session_store(self, session_id, create=False):
         store = self._object_store
@@ -1130,15 +2583,39 @@ class RPC(MessageEmitter):
         a_object,
         session_id=None,
         local_workspace=None,
+        buffers=None,
+        refs=None,
+        ndarray_compression=None,
     ):
-        """Encode object."""
+        """Encode object.
+
+        If `buffers` is a list, large binary payloads are appended to it
+        and only referenced (as msgpack ext types) in the encoded object.
+        If `refs` is an `ObjectRefs`, binary objects which occur more than
+        once are only encoded once and referenced. Large ndarrays are
+        compressed with the `ndarray_compression` codec (if any).
+        """
+        if (
+            buffers is not None
+            and isinstance(a_object, bytes)
+            and len(a_object) >= OOB_MIN_SIZE
+        ):
+            return _add_buffer(buffers, a_object, OOB_BYTES_EXT)
         if isinstance(a_object, (int, float, bool, str, bytes)) or a_object is None:
             return a_object
 
+        # Pass plain data subtrees to msgpack as they are
+        if _is_plain_data(
+            a_object,
+            OOB_MIN_SIZE if buffers is not None or refs is not None else None,
+        ):
+            return a_object
+
         if isinstance(a_object, tuple):
             a_object = list(a_object)
 
-        if isinstance(a_object, dict):
+        # Keep dict subclasses with a codec, e.g. scipy dok matrices
+        if isinstance(a_object, dict) and not self._find_codec(a_object):
             a_object = dict(a_object)
 
         # Reuse the remote object
@@ -1154,6 +2631,9 @@ class RPC(MessageEmitter):
                 a_object,
                 session_id=session_id,
                 local_workspace=local_workspace,
+                buffers=buffers,
+                refs=refs,
+                ndarray_compression=ndarray_compression,
             )
             b_object["_rtype"] = temp
             return b_object
@@ -1202,30 +2682,48 @@ class RPC(MessageEmitter):
         b_object = None
 
         encoded_obj = None
-        for tp in self._codecs:
-            codec = self._codecs[tp]
-            if codec.encoder and isinstance(a_object, codec.type):
-                # TODO: what if multiple encoders found
-                encoded_obj = codec.encoder(a_object)
-                if isinstance(encoded_obj, dict) and "_rtype" not in encoded_obj:
-                    encoded_obj["_rtype"] = codec.name
-                # encode the functions in the interface object
-                if isinstance(encoded_obj, dict):
-                    temp = encoded_obj["_rtype"]
-                    del encoded_obj["_rtype"]
-                    encoded_obj = self._encode(
-                        encoded_obj,
-                        session_id=session_id,
-                        local_workspace=local_workspace,
-                    )
-                    encoded_obj["_rtype"] = temp
-                b_object = encoded_obj
-                return b_object
+        codec = self._find_codec(a_object)
+        if codec:
+            encoded_obj = codec.encoder(a_object)
+            if isinstance(encoded_obj, dict) and "_rtype" not in encoded_obj:
+                encoded_obj["_rtype"] = codec.name
+            # encode the functions in the interface object
+            if isinstance(encoded_obj, dict):
+                temp = encoded_obj["_rtype"]
+                del encoded_obj["_rtype"]
+                encoded_obj = self._encode(
+                    encoded_obj,
+                    session_id=session_id,
+                    local_workspace=local_workspace,
+                    buffers=buffers,
+                    refs=refs,
+                    ndarray_compression=ndarray_compression,
+                )
+                encoded_obj["_rtype"] = temp
+            b_object = encoded_obj
+            return b_object
 
         if self.NUMPY_MODULE and isinstance(
             a_object, (self.NUMPY_MODULE.ndarray, self.NUMPY_MODULE.generic)
         ):
-            v_bytes = a_object.tobytes()
+            if (
+                ndarray_compression
+                and a_object.nbytes >= self._ndarray_compression_threshold
+            ):
+                b_object = _compress_ndarray(
+                    self.NUMPY_MODULE, a_object, ndarray_compression
+                )
+                if buffers is not None:
+                    b_object["_rvalue"] = _add_buffer(buffers, b_object["_rvalue"])
+                return b_object
+            if buffers is not None and a_object.nbytes >= OOB_MIN_SIZE:
+                # Reference the array memory instead of copying it
+                data = self.NUMPY_MODULE.ascontiguousarray(a_object)
+                v_bytes = _add_buffer(
+                    buffers, memoryview(data.reshape(-1).view(self.NUMPY_MODULE.uint8))
+                )
+            else:
+                v_bytes = a_object.tobytes()
             b_object = {
                 "_rtype": "ndarray",
                 "_rvalue": v_bytes,
@@ -1245,7 +2743,15 @@ class RPC(MessageEmitter):
                 "_rtrace": exc_traceback,
             }
         elif isinstance(a_object, memoryview):
-            b_object = {"_rtype": "memoryview", "_rvalue": a_object.tobytes()}
+            if (
+                buffers is not None
+                and a_object.nbytes >= OOB_MIN_SIZE
+                and a_object.c_contiguous
+            ):
+                v_bytes = _add_buffer(buffers, a_object.cast("B"))
+            else:
+                v_bytes = a_object.tobytes()
+            b_object = {"_rtype": "memoryview", "_rvalue": v_bytes}
         elif isinstance(
             a_object, (io.IOBase, io.TextIOBase, io.BufferedIOBase, io.RawIOBase)
         ):
@@ -1258,6 +2764,9 @@ class RPC(MessageEmitter):
                 b_object,
                 session_id=session_id,
                 local_workspace=local_workspace,
+                buffers=buffers,
+                refs=refs,
+                ndarray_compression=ndarray_compression,
             )
 
         # NOTE: "typedarray" is not used
@@ -1268,6 +2777,9 @@ class RPC(MessageEmitter):
                     list(a_object),
                     session_id=session_id,
                     local_workspace=local_workspace,
+                    buffers=buffers,
+                    refs=refs,
+                    ndarray_compression=ndarray_compression,
                 ),
             }
         elif isinstance(a_object, set):
@@ -1277,21 +2789,36 @@ class RPC(MessageEmitter):
                     list(a_object),
                     session_id=session_id,
                     local_workspace=local_workspace,
+                    buffers=buffers,
+                    refs=refs,
+                    ndarray_compression=ndarray_compression,
                 ),
             }
         elif isinstance(a_object, (list, dict)):
             keys = range(len(a_object)) if isarray else a_object.keys()
             b_object = [] if isarray else {}
             for key in keys:
-                encoded = self._encode(
-                    a_object[key],
-                    session_id=session_id,
-                    local_workspace=local_workspace,
-                )
+                value = a_object[key]
+                # Objects seen before in the payload are encoded as references
+                track = refs is not None and self._is_ref_candidate(value)
+                encoded = refs.get(value) if track else None
+                if encoded is None:
+                    encoded = self._encode(
+                        value,
+                        session_id=session_id,
+                        local_workspace=local_workspace,
+                        buffers=buffers,
+                        refs=refs,
+                        ndarray_compression=ndarray_compression,
+                    )
+                else:
+                    track = False
                 if isarray:
                     b_object.append(encoded)
                 else:
                     b_object[key] = encoded
+                if track:
+                    refs.add(value, b_object, key)
         else:
             raise Exception(
                 "imjoy-rpc: Unsupported data type:"
@@ -1311,8 +2838,12 @@ class RPC(MessageEmitter):
         local_parent=None,
         remote_workspace=None,
         local_workspace=None,
+        refs=None,
     ):
-        """Decode object."""
+        """Decode object.
+
+        `refs` are the decoded values of the references in the object.
+        """
         if a_object is None:
             return a_object
         if isinstance(a_object, dict) and "_rtype" in a_object:
@@ -1329,6 +2860,7 @@ class RPC(MessageEmitter):
                     local_parent=local_parent,
                     remote_workspace=remote_workspace,
                     local_workspace=local_workspace,
+                    refs=refs,
                 )
                 a_object["_rtype"] = temp
                 b_object = self._codecs[a_object["_rtype"]].decoder(a_object)
@@ -1343,13 +2875,21 @@ class RPC(MessageEmitter):
             elif a_object["_rtype"] == "ndarray":
                 # create build array/tensor if used in the plugin
                 try:
-                    if isinstance(a_object["_rvalue"], (list, tuple)):
-                        a_object["_rvalue"] = reduce(
-                            (lambda x, y: x + y), a_object["_rvalue"]
+                    if a_object.get("_rcompression"):
+                        a_object["_rvalue"] = _decompress_ndarray(
+                            self.NUMPY_MODULE, a_object, self._max_message_buffer_size
                         )
-                    # make sure we have bytes instead of memoryview, e.g. for Pyodide
+                    elif isinstance(a_object["_rvalue"], (list, tuple)):
+                        a_object["_rvalue"] = _join_chunks(
+                            self.NUMPY_MODULE,
+                            a_object["_rvalue"],
+                            a_object["_rshape"],
+                            a_object["_rdtype"],
+                        )
+                    # out-of-band buffers are decoded as views into the message
                     elif isinstance(a_object["_rvalue"], memoryview):
-                        a_object["_rvalue"] = a_object["_rvalue"].tobytes()
+                        if not self.NUMPY_MODULE:
+                            a_object["_rvalue"] = a_object["_rvalue"].tobytes()
                     elif not isinstance(a_object["_rvalue"], bytes):
                         raise Exception(
                             "Unsupported data type: " + str(type(a_object["_rvalue"]))
@@ -1371,6 +2911,31 @@ class RPC(MessageEmitter):
                     raise exc
             elif a_object["_rtype"] == "memoryview":
                 b_object = memoryview(a_object["_rvalue"])
+            elif a_object["_rtype"] == "refs":
+                # decode the repeated objects once, for the references
+                values = [
+                    self._decode(
+                        value,
+                        remote_parent=remote_parent,
+                        local_parent=local_parent,
+                        remote_workspace=remote_workspace,
+                        local_workspace=local_workspace,
+                        refs=refs,
+                    )
+                    for value in a_object["_rrefs"]
+                ]
+                b_object = self._decode(
+                    a_object["_rvalue"],
+                    remote_parent=remote_parent,
+                    local_parent=local_parent,
+                    remote_workspace=remote_workspace,
+                    local_workspace=local_workspace,
+                    refs=values,
+                )
+            elif a_object["_rtype"] == "ref":
+                if refs is None:
+                    raise ValueError("Unexpected reference without values")
+                b_object = refs[a_object["_rvalue"]]
             elif a_object["_rtype"] == "iostream":
                 b_object = dotdict(
                     {
@@ -1380,6 +2945,7 @@ class RPC(MessageEmitter):
                             local_parent=local_parent,
                             remote_workspace=remote_workspace,
                             local_workspace=local_workspace,
+                            refs=refs,
                         )
                         for k in a_object
                         if not k.startswith("_")
@@ -1401,6 +2967,7 @@ class RPC(MessageEmitter):
                         local_parent=local_parent,
                         remote_workspace=remote_workspace,
                         local_workspace=local_workspace,
+                        refs=refs,
                     )
                 )
             elif a_object["_rtype"] == "set":
@@ -1411,6 +2978,7 @@ class RPC(MessageEmitter):
                         local_parent=local_parent,
                         remote_workspace=remote_workspace,
                         local_workspace=local_workspace,
+                        refs=refs,
                     )
                 )
             elif a_object["_rtype"] == "error":
@@ -1430,15 +2998,33 @@ class RPC(MessageEmitter):
                     local_parent=local_parent,
                     remote_workspace=remote_workspace,
                     local_workspace=local_workspace,
+                    refs=refs,
                 )
                 a_object["_rtype"] = temp
                 b_object = a_object
         elif isinstance(a_object, (dict, list, tuple)):
+            if _is_plain_data(a_object):
+                return _plain_to_dotdict(a_object)
+            if isinstance(a_object, dict) and any(
+                _is_service_method(v) for v in dict.values(a_object)
+            ):
+                # generate the remote methods of a service on first access
+                return LazyDotDict(
+                    a_object,
+                    partial(
+                        self._decode,
+                        remote_parent=remote_parent,
+                        local_parent=local_parent,
+                        remote_workspace=remote_workspace,
+                        local_workspace=local_workspace,
+                        refs=refs,
+                    ),
+                )
             if isinstance(a_object, tuple):
                 a_object = list(a_object)
             isarray = isinstance(a_object, list)
             b_object = [] if isarray else dotdict()
-            keys = range(len(a_object)) if isarray else a_object.keys()
+            keys = range(len(a_object)) if isarray else dict.keys(a_object)
             for key in keys:
                 val = a_object[key]
                 if isarray:
@@ -1449,6 +3035,7 @@ class RPC(MessageEmitter):
                             local_parent=local_parent,
                             remote_workspace=remote_workspace,
                             local_workspace=local_workspace,
+                            refs=refs,
                         )
                     )
                 else:
@@ -1458,6 +3045,7 @@ class RPC(MessageEmitter):
                         local_parent=local_parent,
                         remote_workspace=remote_workspace,
                         local_workspace=local_workspace,
+                        refs=refs,
                     )
         # make sure we have bytes instead of memoryview, e.g. for Pyodide
         # elif isinstance(a_object, memoryview):
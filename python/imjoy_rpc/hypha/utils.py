@@ -1,18 +1,17 @@
 """Provide utility functions for RPC."""
 import ast
 import asyncio
-import contextlib
 import copy
 import inspect
-import io
 import re
 import secrets
 import string
 import traceback
+import weakref
 import collections.abc
-from functools import partial
+from functools import lru_cache, partial
 from inspect import Parameter, Signature
-from types import BuiltinFunctionType, FunctionType
+from types import BuiltinFunctionType, FunctionType, MethodType
 from typing import Any
 
 
@@ -71,6 +70,129 @@ class dotdict(dict):  # pylint: disable=invalid-name
             return None
 
 
+class LazyDotDict(dotdict):  # pylint: disable=invalid-name
+    """A dotdict which decodes its values on first access.
+
+    The encoded values of containers (e.g. remote methods) are stored until
+    they are accessed, such that for a service with many methods only the
+    methods which are used get generated.
+    """
+
+    def __init__(self, encoded, decode):
+        """Set up the dictionary with the encoded values."""
+        super().__init__(encoded)
+        pending = {
+            k for k, v in dict.items(encoded) if isinstance(v, (dict, list, tuple))
+        }
+        object.__setattr__(self, "_LazyDotDict__pending", pending)
+        object.__setattr__(self, "_LazyDotDict__decode", decode)
+
+    def __getitem__(self, key):
+        """Get the item, decode it if needed."""
+        if key in self.__pending:
+            value = self.__decode(dict.__getitem__(self, key))
+            dict.__setitem__(self, key, value)
+            self.__pending.discard(key)
+            return value
+        return dict.__getitem__(self, key)
+
+    def __setitem__(self, key, value):
+        """Set the item."""
+        self.__pending.discard(key)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        """Delete the item."""
+        self.__pending.discard(key)
+        dict.__delitem__(self, key)
+
+    def __setattr__(self, name, value):
+        """Set the attribute."""
+        self.__pending.discard(name)
+        super().__setattr__(name, value)
+
+    __delattr__ = __delitem__
+
+    def __iter__(self):
+        """Iterate over the keys.
+
+        Note: this also makes `dict(obj)` and `{**obj}` use `__getitem__`.
+        """
+        return dict.__iter__(self)
+
+    def __dir__(self):
+        """List the attributes, including the keys."""
+        keys = [k for k in dict.keys(self) if isinstance(k, str)]
+        return list(super().__dir__()) + keys
+
+    def _decode_all(self):
+        """Decode all the pending values."""
+        for key in list(self.__pending):
+            self[key]
+
+    def get(self, key, default=None):
+        """Get the item or return the default."""
+        return self[key] if key in self else default
+
+    def items(self):
+        """Return the decoded items."""
+        self._decode_all()
+        return dict.items(self)
+
+    def values(self):
+        """Return the decoded values."""
+        self._decode_all()
+        return dict.values(self)
+
+    def copy(self):
+        """Return a shallow copy with the decoded values."""
+        self._decode_all()
+        return dict.copy(self)
+
+    def pop(self, key, *args):
+        """Remove the item and return its decoded value."""
+        if key in self:
+            value = self[key]
+            del self[key]
+            return value
+        return dict.pop(self, key, *args)
+
+    def popitem(self):
+        """Remove and return the last item."""
+        self._decode_all()
+        return dict.popitem(self)
+
+    def setdefault(self, key, default=None):
+        """Get the item or set it to the default."""
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
+
+    def update(self, *args, **kwargs):
+        """Update the dictionary."""
+        for key in dict(*args, **kwargs):
+            self.__pending.discard(key)
+        dict.update(self, *args, **kwargs)
+
+    def __eq__(self, other):
+        """Compare the decoded items."""
+        self._decode_all()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        """Compare the decoded items."""
+        self._decode_all()
+        return dict.__ne__(self, other)
+
+    __hash__ = dotdict.__hash__
+
+    def __repr__(self):
+        """Represent the decoded items."""
+        self._decode_all()
+        return dict.__repr__(self)
+
+
 def format_traceback(traceback_string):
     """Format traceback."""
     formatted_lines = traceback_string.splitlines()
@@ -309,21 +431,14 @@ def register_default_codecs(options=None):
 
 def extract_function_info(func):
     """Extract function info."""
-    # Create an in-memory text stream
-    f = io.StringIO()
-
-    # Redirect the output of help to the text stream
-    with contextlib.redirect_stdout(f):
-        help(func)
-    help_string = f.getvalue()
-    match = re.search(r"(\w+)\((.*?)\)\n\s*(.*)", help_string, re.DOTALL)
-    if match:
-        func_name, func_signature, docstring = match.groups()
-        # Clean up the docstring
-        docstring = func.__doc__ or re.sub(r"\n\s*", " ", docstring).strip()
-        return {"name": func_name, "sig": func_signature, "doc": docstring}
-    else:
+    try:
+        signature = inspect.signature(func)
+    except (TypeError, ValueError):
         return None
+    func_name = getattr(func, "__name__", None) or type(func).__name__
+    # Only keep the parameters, without the return annotation
+    func_signature = str(Signature(parameters=list(signature.parameters.values())))
+    return {"name": func_name, "sig": func_signature[1:-1], "doc": func.__doc__ or ""}
 
 
 def make_signature(func, name=None, sig=None, doc=None):
@@ -352,8 +467,12 @@ def make_signature(func, name=None, sig=None, doc=None):
         func.__name__ = name
 
 
+@lru_cache(maxsize=1024)
 def _str_to_signature(sig_str):
-    """Parse signature string into name and Signature object."""
+    """Parse signature string into name and Signature object.
+
+    The results are cached, `Signature` objects are immutable.
+    """
     sig_str = sig_str.strip()
     # Map of common type annotations
     type_map = {
@@ -455,8 +574,41 @@ def _str_to_signature(sig_str):
         return func_name, Signature(parameters=params)
 
 
+# Cache the signature and docstring per callable object
+_callable_metadata = weakref.WeakKeyDictionary()
+
+
+def _get_callable_metadata(any_callable, key, compute):
+    """Get the cached metadata of a callable, or compute and cache it."""
+    if inspect.ismethod(any_callable):
+        # Bound methods are created on every attribute access,
+        # so we cache them on the underlying function instead
+        owner, key = any_callable.__func__, ("method",) + key
+    else:
+        owner = any_callable
+    try:
+        metadata = _callable_metadata.get(owner)
+        if metadata is None:
+            metadata = _callable_metadata[owner] = {}
+    except TypeError:
+        # e.g. built-in functions can not be weakly referenced
+        return compute(any_callable)
+    if key not in metadata:
+        metadata[key] = compute(any_callable)
+    return metadata[key]
+
+
 def callable_sig(any_callable, skip_context=False):
     """Return the signature of a callable."""
+    return _get_callable_metadata(
+        any_callable,
+        ("sig", skip_context),
+        partial(_callable_sig, skip_context=skip_context),
+    )
+
+
+def _callable_sig(any_callable, skip_context=False):
+    """Compute the signature of a callable."""
     try:
         if isinstance(any_callable, partial):
             signature = inspect.signature(any_callable.func)
@@ -467,7 +619,7 @@ def callable_sig(any_callable, skip_context=False):
             name = any_callable.__name__
             fixed = set()
         elif hasattr(any_callable, "__call__") and not isinstance(
-            any_callable, (FunctionType, BuiltinFunctionType)
+            any_callable, (FunctionType, BuiltinFunctionType, MethodType)
         ):
             signature = inspect.signature(any_callable)
             name = type(any_callable).__name__
@@ -514,6 +666,11 @@ def callable_sig(any_callable, skip_context=False):
 
 def callable_doc(any_callable):
     """Return the docstring of a callable."""
+    return _get_callable_metadata(any_callable, ("doc",), _callable_doc)
+
+
+def _callable_doc(any_callable):
+    """Compute the docstring of a callable."""
     if isinstance(any_callable, partial):
         return any_callable.func.__doc__
 
@@ -71,6 +71,8 @@ class WebRTCConnection:
             raise Exception("No handler for message")
 
         try:
+            if isinstance(data, (list, tuple)):
+                data = b"".join(data)
             self._data_channel.send(data)
         except Exception as exp:
             if self._logger:
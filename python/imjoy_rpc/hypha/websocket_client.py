@@ -1,13 +1,24 @@
 """Provide a websocket client."""
 import asyncio
 import inspect
+import io
 import logging
 import sys
 
 import msgpack
 import shortuuid
 
-from .rpc import RPC
+from .rpc import (
+    CHUNK_WINDOW,
+    COMPRESSION_THRESHOLD,
+    MAX_CHUNK_SIZE,
+    MAX_FRAME_SIZE,
+    MAX_MESSAGE_BUFFER_SIZE,
+    MESSAGE_CACHE_SIZE,
+    MESSAGE_CACHE_TTL,
+    NDARRAY_COMPRESSION_THRESHOLD,
+    RPC,
+)
 from .utils import dotdict
 
 try:
@@ -35,6 +46,8 @@ logger = logging.getLogger("websocket-client")
 logger.setLevel(logging.WARNING)
 
 MAX_RETRY = 10000
+# Message types used by the RPC itself
+RESERVED_TYPES = ("method", "batch")
 
 
 class WebsocketRPCConnection:
@@ -112,9 +125,12 @@ class WebsocketRPCConnection:
         if not self._websocket or self._websocket.closed:
             await self.open()
         try:
+            # A list of buffers is sent as one fragmented message
             await self._websocket.send(data)
         except Exception:
-            data = msgpack.unpackb(data)
+            if isinstance(data, (list, tuple)):
+                data = data[0]
+            data = msgpack.Unpacker(io.BytesIO(data)).unpack()
             logger.exception(f"Failed to send data to {data['to']}")
             raise
 
@@ -231,6 +247,31 @@ async def connect_to_server(config):
         name=config.get("name"),
         method_timeout=config.get("method_timeout"),
         loop=config.get("loop"),
+        oob_buffers=config.get("oob_buffers", False),
+        zero_copy=config.get("zero_copy", False),
+        compression=config.get("compression"),
+        compression_threshold=config.get(
+            "compression_threshold", COMPRESSION_THRESHOLD
+        ),
+        ndarray_compression=config.get("ndarray_compression"),
+        ndarray_compression_threshold=config.get(
+            "ndarray_compression_threshold", NDARRAY_COMPRESSION_THRESHOLD
+        ),
+        dedup_objects=config.get("dedup_objects", False),
+        chunk_window=config.get("chunk_window", CHUNK_WINDOW),
+        message_spill_threshold=config.get("message_spill_threshold"),
+        message_spill_dir=config.get("message_spill_dir"),
+        message_cache_ttl=config.get("message_cache_ttl", MESSAGE_CACHE_TTL),
+        message_cache_size=config.get("message_cache_size", MESSAGE_CACHE_SIZE),
+        max_message_buffer_size=config.get(
+            "max_message_buffer_size", MAX_MESSAGE_BUFFER_SIZE
+        ),
+        max_frame_size=config.get("max_frame_size", MAX_FRAME_SIZE),
+        chunk_dedup=config.get("chunk_dedup", False),
+        chunk_store_size=config.get("chunk_store_size", 0),
+        chunk_size=config.get("chunk_size"),
+        max_chunk_size=config.get("max_chunk_size", MAX_CHUNK_SIZE),
+        batch_window=config.get("batch_window"),
     )
     wm = await rpc.get_remote_service("workspace-manager:default")
     wm.rpc = rpc
@@ -265,11 +306,11 @@ async def connect_to_server(config):
         assert isinstance(message, dict), "message must be a dictionary"
         assert "to" in message, "message must have a 'to' field"
         assert "type" in message, "message must have a 'type' field"
-        assert message["type"] != "method", "message type cannot be 'method'"
+        assert message["type"] not in RESERVED_TYPES, "reserved message type"
         return rpc.emit(message)
 
     def on_msg(type, handler):
-        assert type != "method", "message type cannot be 'method'"
+        assert type not in RESERVED_TYPES, "reserved message type"
         rpc.on(type, handler)
 
     wm.emit = emit_msg
@@ -10,9 +10,15 @@ import traceback
 import uuid
 import weakref
 from collections import OrderedDict
-from functools import reduce
 
+from .compression import (
+    COMPRESSION_CODECS,
+    _compress_ndarray,
+    _decompress_ndarray,
+    _join_chunks,
+)
 from .utils import (
+    CodecRegistry,
     FuturePromise,
     MessageEmitter,
     ReferenceStore,
@@ -21,6 +27,8 @@ from .utils import (
 )
 
 API_VERSION = "0.2.3"
+# Smaller ndarrays are not compressed
+NDARRAY_COMPRESSION_THRESHOLD = 64 * 1024
 ALLOWED_MAGIC_METHODS = ["__enter__", "__exit__"]
 IO_METHODS = [
     "fileno",
@@ -82,7 +90,10 @@ class RPC(MessageEmitter):
         self._remote_set = False
         self._store = ReferenceStore()
         self._remote_interface = None
-        self._codecs = codecs or {}
+        # Note: the codecs can be shared with (and registered by) the connection
+        if not isinstance(codecs, CodecRegistry):
+            codecs = CodecRegistry(codecs or {})
+        self._codecs = codecs
         self.work_dir = os.getcwd()
         self.abort = threading.Event()
         self.id = None
@@ -151,6 +162,17 @@ class RPC(MessageEmitter):
             config = dotdict()
         self.id = config.id or self.id or str(uuid.uuid4())
         self.allow_execution = config.allow_execution or False
+        # Compress the bytes of large ndarrays, after a byte shuffle,
+        # the remote peer needs to support it
+        ndarray_compression = config.ndarray_compression
+        if ndarray_compression is True:
+            ndarray_compression = next(iter(COMPRESSION_CODECS))
+        if ndarray_compression and ndarray_compression not in COMPRESSION_CODECS:
+            raise ValueError(f"Unsupported compression: {ndarray_compression}")
+        self._ndarray_compression = ndarray_compression
+        self._ndarray_compression_threshold = (
+            config.ndarray_compression_threshold or NDARRAY_COMPRESSION_THRESHOLD
+        )
         self.config = dotdict(
             {
                 "allow_execution": self.allow_execution,
@@ -592,6 +614,10 @@ class RPC(MessageEmitter):
         wrapped = self._encode(args, as_interface=as_interface)
         return wrapped
 
+    def _find_codec(self, a_object):
+        """Find the encoder codec for an object."""
+        return self._codecs.find_encoder(type(a_object))
+
     def _encode(self, a_object, as_interface=False, object_id=None):
         """Encode object."""
         if isinstance(a_object, (int, float, bool, str, bytes)) or a_object is None:
@@ -647,25 +673,30 @@ class RPC(MessageEmitter):
         b_object = None
 
         encoded_obj = None
-        for tp in self._codecs:
-            codec = self._codecs[tp]
-            if codec.encoder and isinstance(a_object, codec.type):
-                # TODO: what if multiple encoders found
-                encoded_obj = codec.encoder(a_object)
-                if isinstance(encoded_obj, dict) and "_rtype" not in encoded_obj:
-                    encoded_obj["_rtype"] = codec.name
-                # encode the functions in the interface object
-                if isinstance(encoded_obj, dict) and "_rintf" in encoded_obj:
-                    temp = encoded_obj["_rtype"]
-                    del encoded_obj["_rtype"]
-                    encoded_obj = self._encode(encoded_obj, True)
-                    encoded_obj["_rtype"] = temp
-                b_object = encoded_obj
-                return b_object
+        codec = self._find_codec(a_object)
+        if codec:
+            encoded_obj = codec.encoder(a_object)
+            if isinstance(encoded_obj, dict) and "_rtype" not in encoded_obj:
+                encoded_obj["_rtype"] = codec.name
+            # encode the functions in the interface object
+            if isinstance(encoded_obj, dict) and "_rintf" in encoded_obj:
+                temp = encoded_obj["_rtype"]
+                del encoded_obj["_rtype"]
+                encoded_obj = self._encode(encoded_obj, True)
+                encoded_obj["_rtype"] = temp
+            b_object = encoded_obj
+            return b_object
 
         if self.NUMPY_MODULE and isinstance(
             a_object, (self.NUMPY_MODULE.ndarray, self.NUMPY_MODULE.generic)
         ):
+            if (
+                self._ndarray_compression
+                and a_object.nbytes >= self._ndarray_compression_threshold
+            ):
+                return _compress_ndarray(
+                    self.NUMPY_MODULE, a_object, self._ndarray_compression
+                )
             v_bytes = a_object.tobytes()
             b_object = {
                 "_rtype": "ndarray",
@@ -807,9 +838,16 @@ class RPC(MessageEmitter):
             elif a_object["_rtype"] == "ndarray":
                 # create build array/tensor if used in the plugin
                 try:
-                    if isinstance(a_object["_rvalue"], (list, tuple)):
-                        a_object["_rvalue"] = reduce(
-                            (lambda x, y: x + y), a_object["_rvalue"]
+                    if a_object.get("_rcompression"):
+                        a_object["_rvalue"] = _decompress_ndarray(
+                            self.NUMPY_MODULE, a_object
+                        )
+                    elif isinstance(a_object["_rvalue"], (list, tuple)):
+                        a_object["_rvalue"] = _join_chunks(
+                            self.NUMPY_MODULE,
+                            a_object["_rvalue"],
+                            a_object["_rshape"],
+                            a_object["_rdtype"],
                         )
                     # make sure we have bytes instead of memoryview, e.g. for Pyodide
                     elif isinstance(a_object["_rvalue"], memoryview):
@@ -58,6 +58,55 @@ class dotdict(dict):  # pylint: disable=invalid-name
         return dotdict(copy.deepcopy(dict(self), memo=memo))
 
 
+def _resolve_codec(codecs, tp):
+    """Resolve the encoder codec for a type through its MRO."""
+    # The codec registered for the most specific class takes precedence
+    for base in tp.__mro__:
+        for codec in codecs.values():
+            if not codec.encoder or not codec.type:
+                continue
+            if codec.type is base or (
+                isinstance(codec.type, tuple) and base in codec.type
+            ):
+                return codec
+    # e.g. abstract base classes with virtual subclasses
+    for codec in codecs.values():
+        if codec.encoder and codec.type and issubclass(tp, codec.type):
+            return codec
+    return None
+
+
+class CodecRegistry(dict):
+    """Keep the registered codecs by name, with the encoder of each type.
+
+    The encoders resolved for the types are cleared whenever a codec is
+    registered or removed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Set up the registry."""
+        super().__init__(*args, **kwargs)
+        self._encoders = {}
+
+    def __setitem__(self, name, codec):
+        """Register a codec."""
+        super().__setitem__(name, codec)
+        self._encoders.clear()
+
+    def __delitem__(self, name):
+        """Remove a codec."""
+        super().__delitem__(name)
+        self._encoders.clear()
+
+    def find_encoder(self, tp):
+        """Return the encoder codec for a type, or None."""
+        try:
+            return self._encoders[tp]
+        except KeyError:
+            codec = self._encoders[tp] = _resolve_codec(self, tp)
+            return codec
+
+
 def format_traceback(traceback_string):
     """Format traceback."""
     formatted_lines = traceback_string.splitlines()
@@ -0,0 +1,698 @@
+"""Test the encoding and decoding of the hypha RPC."""
+import asyncio
+import mmap
+import time
+import zlib
+
+import msgpack
+import numpy as np
+import pytest
+from imjoy_rpc.hypha.rpc import (
+    MESSAGE_CACHE_SIZE,
+    PEER_CACHE_SIZE,
+    RPC,
+    ChunkSizeController,
+    InlineBuffers,
+    RemoteException,
+    _hash_chunk,
+    _iter_chunks,
+)
+from imjoy_rpc.compression import _decompress_ndarray
+from imjoy_rpc.hypha import encode_ndarray
+from imjoy_rpc.hypha.utils import dotdict
+
+
+@pytest.fixture(name="rpc")
+def rpc_fixture():
+    """Create an RPC instance without connection."""
+    return RPC(None, client_id="test-client")
+
+
+def test_decode_chunked_ndarray(rpc):
+    """Test decoding an ndarray with the bytes split into chunks."""
+    array = np.arange(1000, dtype="float32").reshape(10, 100)
+    data = array.tobytes()
+    encoded = {
+        "_rtype": "ndarray",
+        "_rvalue": [data[idx : idx + 333] for idx in range(0, len(data), 333)],
+        "_rshape": [10, 100],
+        "_rdtype": "float32",
+    }
+    np.testing.assert_array_equal(rpc.decode(encoded), array)
+
+    encoded["_rvalue"] = [data[:100]]
+    with pytest.raises(ValueError):
+        rpc.decode(encoded)
+
+
+def test_codec_dispatch(rpc):
+    """Test resolving and caching the codecs by type."""
+
+    class Base:
+        pass
+
+    class Derived(Base):
+        pass
+
+    rpc.register_codec(
+        {"name": "base", "type": Base, "encoder": lambda obj: {"kind": "base"}}
+    )
+    assert rpc.encode([Derived()])[0] == {"kind": "base", "_rtype": "base"}
+
+    # The codec for the most specific class is used, and the cache is updated
+    rpc.register_codec(
+        {"name": "derived", "type": Derived, "encoder": lambda obj: {"kind": "d"}}
+    )
+    assert rpc.encode(Derived()) == {"kind": "d", "_rtype": "derived"}
+    assert rpc.encode(Base()) == {"kind": "base", "_rtype": "base"}
+    # removing a codec also clears the cache
+    del rpc._codecs["derived"]
+    assert rpc.encode(Derived()) == {"kind": "base", "_rtype": "base"}
+
+
+def test_plain_data(rpc):
+    """Test encoding and decoding plain data subtrees."""
+    table = {"rows": [{"id": idx, "name": f"row{idx}"} for idx in range(10)]}
+    assert rpc.encode(table) is table
+    decoded = rpc.decode({"rows": table["rows"], "meta": (1, 2.0, None)})
+    assert decoded.rows[3].name == "row3"
+    assert decoded.meta == [1, 2.0, None]
+    # keys which shadow the dict methods of a dotdict
+    decoded = rpc.decode(dotdict(values=[1, 2], items=dotdict(keys="a")))
+    assert decoded == {"values": [1, 2], "items": {"keys": "a"}}
+
+    def callback():
+        pass
+
+    encoded = rpc.encode({"table": table, "callback": callback}, session_id="s")
+    assert encoded["table"] is table
+    assert encoded["callback"]["_rtype"] == "method"
+
+
+def test_decode_unpacked_message(rpc):
+    """Test decoding received dictionaries with keys named as dict methods."""
+    method = {"_rtype": "method", "_rtarget": "ws/client", "_rpromise": True}
+    service = {
+        "ns": {
+            "get": dict(method, _rmethod="services.kv.ns.get"),
+            "put": dict(method, _rmethod="services.kv.ns.put"),
+        },
+        "items": {"keys": [1, 2]},
+    }
+    message = rpc._pack_message({"type": "method"}, {"args": [service]})
+    _, extra = rpc._unpack_message(message)
+    # the received dictionaries are plain until decoded
+    assert type(extra["args"][0]["ns"]) is dict
+    decoded = rpc.decode(extra["args"][0])
+    assert callable(decoded.ns["get"]) and callable(decoded.ns["put"])
+    assert decoded["items"] == {"keys": [1, 2]}
+
+
+def test_remote_method_cache(rpc):
+    """Test reusing the remote methods of services."""
+    encoded = {
+        "_rtype": "method",
+        "_rtarget": "ws/client",
+        "_rmethod": "services.hello.say",
+        "_rpromise": True,
+        "_rsig": "say(name: str, loud=False)",
+        "_rdoc": "Say hello.",
+    }
+    method = rpc.decode(dict(encoded))
+    assert rpc.decode(dict(encoded)) is method
+    assert method.__name__ == "say" and method.__doc__ == "Say hello."
+    # Methods decoded for another workspace are not reused
+    assert rpc._decode(dict(encoded), remote_workspace="ws") is not method
+    # Methods of a session are not reused
+    session_method = dict(encoded, _rmethod="session.say")
+    assert rpc.decode(dict(session_method)) is not rpc.decode(dict(session_method))
+
+
+@pytest.mark.asyncio
+async def test_call_payload_copy():
+    """Test that the payloads are copied unless `zero_copy` is set."""
+    encoded = {"_rtype": "method", "_rtarget": "ws/client", "_rmethod": "a.b"}
+    for zero_copy, promise, copied in [
+        (False, True, True),
+        (True, False, True),
+        (True, True, False),
+    ]:
+        rpc = RPC(None, client_id="test-client", zero_copy=zero_copy)
+        sent = []
+
+        async def emit_message(package, sent=sent):
+            sent.append(b"".join(package) if isinstance(package, list) else package)
+
+        rpc._emit_message = emit_message
+        array = np.zeros(100000, dtype="uint8")
+        rpc.decode(dict(encoded, _rpromise=promise))(array)
+        # the array can be modified once the method is called
+        array[:] = 1
+        await asyncio.sleep(0.1)
+        _, extra = rpc._unpack_message(sent[0])
+        assert (not rpc.decode(extra["args"][0]).any()) == copied
+
+
+def test_lazy_service(rpc):
+    """Test generating the remote methods of a service on first access."""
+
+    def method(name):
+        return {
+            "_rtype": "method",
+            "_rtarget": "ws/client",
+            "_rmethod": f"services.hello.{name}",
+            "_rpromise": True,
+        }
+
+    service = rpc.decode(
+        {"id": "hello", "say": method("say"), "nested": {"add": method("add")}}
+    )
+    assert "say" in dir(service) and len(service) == 3
+    # the method descriptions are kept until the methods are used
+    assert dict.__getitem__(service, "say")["_rtype"] == "method"
+    assert callable(service.say)
+    assert callable(dict.__getitem__(service, "say"))
+    assert dict.__getitem__(service, "nested")["add"]["_rtype"] == "method"
+    assert callable(service.nested.add)
+    assert callable(dict(service)["say"]) and callable({**service}["nested"].add)
+    assert service.id == "hello" and service.get("missing") is None
+    # other dictionaries with methods (e.g. callbacks) are decoded at once
+    callbacks = rpc.decode(
+        {"resolve": dict(method("x"), _rmethod="session.resolve"), "get": 1}
+    )
+    assert type(callbacks) is dotdict
+    assert callable(dict.__getitem__(callbacks, "resolve"))
+
+
+def test_ndarray_compression():
+    """Test encoding ndarrays with byte shuffle and compression."""
+    rpc = RPC(None, client_id="test-client", ndarray_compression="zlib")
+    image = np.linspace(0, 1, 512 * 512, dtype="float32").reshape(512, 512)
+    encoded = rpc.encode(image)
+    assert encoded["_rcompression"] == "zlib" and encoded["_rshuffle"]
+    assert len(encoded["_rvalue"]) < image.nbytes / 2
+    np.testing.assert_array_equal(rpc.decode(encoded), image)
+    # small arrays are not compressed
+    assert "_rcompression" not in rpc.encode(image[:10, :10])
+
+    # compress the arrays of a single call
+    labels = np.zeros((256, 256), dtype="uint16")
+    labels[10:50, 20:80] = 3
+    encoded = RPC(None, client_id="test-client").encode(
+        {"labels": encode_ndarray(labels, shuffle=False)}
+    )
+    assert encoded["labels"]["_rcompression"] == "zlib"
+    data = encoded["labels"]["_rvalue"]
+    encoded["labels"]["_rvalue"] = [data[:100], data[100:]]
+    np.testing.assert_array_equal(rpc.decode(encoded)["labels"], labels)
+
+    # the decompressed data is limited to the declared shape
+    encoded = encode_ndarray(labels, shuffle=False)
+    encoded["_rshape"] = [16, 16]
+    with pytest.raises(ValueError, match="exceeds"):
+        _decompress_ndarray(np, encoded)
+
+
+def test_dedup_objects():
+    """Test encoding the repeated objects of a payload as references."""
+    rpc = RPC(None, client_id="test-client", dedup_objects=True)
+    image = np.arange(64 * 64, dtype="uint16").reshape(64, 64)
+    data = b"x" * 2048
+    payload = [image, {"image": image, "get": data, "items": [data, image]}]
+    encoded = rpc.encode(payload)
+    assert encoded["_rtype"] == "refs" and len(encoded["_rrefs"]) == 2
+    size = len(msgpack.packb(encoded))
+    assert size < len(msgpack.packb(RPC(None, client_id="test").encode(payload)))
+    assert size < image.nbytes + len(data) + 1024
+
+    decoded = rpc.decode(msgpack.unpackb(msgpack.packb(encoded)))
+    np.testing.assert_array_equal(decoded[0], image)
+    assert decoded[1]["image"] is decoded[0]
+    assert decoded[1]["items"][1] is decoded[0]
+    assert decoded[1]["get"] == data
+    assert decoded[1]["items"][0] is decoded[1]["get"]
+    # payloads without repeated objects are not wrapped
+    assert isinstance(rpc.encode([image, data]), list)
+
+
+@pytest.mark.asyncio
+async def test_negotiate_encoding():
+    """Test using the payload encodings supported by the target only."""
+    rpc = RPC(
+        None,
+        client_id="test-client",
+        oob_buffers=True,
+        dedup_objects=True,
+        ndarray_compression="zlib",
+        loop=asyncio.get_running_loop(),
+    )
+    supported = {
+        "ws/new": dotdict(oob_buffers=True, ndarray_compression=["zlib"]),
+        "ws/old": dotdict(),
+    }
+
+    async def get_remote_service(service_uri):
+        return supported[service_uri.split(":")[0]]
+
+    rpc.get_remote_service = get_remote_service
+    # the payloads are encoded without them until the target is known
+    assert not rpc._get_encoding("ws/new")["oob_buffers"]
+    assert rpc._get_encoding("ws/old")["ndarray_compression"] is None
+    await asyncio.sleep(0.01)
+    assert rpc._get_encoding("ws/new") == {
+        "oob_buffers": True,
+        "dedup_objects": False,
+        "ndarray_compression": "zlib",
+    }
+    assert not any(rpc._get_encoding("ws/old").values())
+
+
+def test_dataframe_codec(rpc):
+    """Test encoding pandas DataFrames column by column."""
+    pd = pytest.importorskip("pandas")
+    df = pd.DataFrame(
+        {
+            "id": np.arange(6),
+            "score": np.linspace(0, 1, 6, dtype="float32"),
+            "name": ["a", "bb", None, "ccc", "é", ""],
+            "label": pd.Categorical(["x", "y"] * 3),
+            "time": pd.date_range("2023-01-01", periods=6),
+            "count": pd.array([1, None, 3, 4, 5, 6], dtype="Int64"),
+        },
+        index=pd.Index([f"row{idx}" for idx in range(6)], name="row"),
+    )
+    encoded = rpc.encode(df)
+    assert encoded["_rtype"] == "pandas.DataFrame"
+    assert encoded["columns"][1]["values"]["_rtype"] == "ndarray"
+    assert encoded["columns"][2]["kind"] == "string"
+    pd.testing.assert_frame_equal(rpc.decode(encoded), df)
+
+    df = df.set_index(["id", "label"])
+    pd.testing.assert_frame_equal(rpc.decode(rpc.encode(df)), df)
+
+    # time zones, periods, intervals and the frequency of the index
+    df = pd.DataFrame(
+        {
+            "time": pd.date_range("2023-01-01", periods=6, tz="Europe/Berlin"),
+            "period": pd.period_range("2023-01", periods=6, freq="M"),
+            "interval": pd.interval_range(0, 6),
+        },
+        index=pd.date_range("2023-01-01", periods=6, freq="D", name="day"),
+    )
+    df.iloc[2, :2] = None
+    encoded = rpc.encode(df)
+    assert encoded["columns"][0]["values"]["_rtype"] == "ndarray"
+    decoded = rpc.decode(encoded)
+    pd.testing.assert_frame_equal(decoded, df)
+    assert decoded.index.freq == df.index.freq
+
+
+def test_sparse_codec(rpc):
+    """Test encoding scipy sparse matrices without densifying them."""
+    sparse = pytest.importorskip("scipy.sparse")
+    matrix = sparse.random(200, 100, density=0.05, format="csr", random_state=0)
+    for fmt in ["csr", "csc", "coo", "dok"]:
+        encoded = rpc.encode(matrix.asformat(fmt))
+        assert encoded["_rtype"] == "scipy.sparse"
+        assert encoded["data"]["_rtype"] == "ndarray"
+        decoded = rpc.decode(encoded)
+        assert decoded.format == fmt and decoded.shape == matrix.shape
+        assert (decoded != matrix).nnz == 0
+
+
+def test_unpack_message(rpc):
+    """Test unpacking messages with the reused unpacker."""
+    main = {"type": "method", "to": "test-client", "method": "services.a.b"}
+    small = {"args": [1, "x"]}
+    large = {"args": [b"x" * 200000]}
+    for extra in [small, large, None, small]:
+        message = msgpack.packb(main)
+        if extra:
+            message += msgpack.packb(extra)
+        assert rpc._unpack_message(message) == (main, extra)
+    # a broken message does not affect the following ones
+    message = msgpack.packb(main) + msgpack.packb(small)
+    with pytest.raises(msgpack.exceptions.OutOfData):
+        rpc._unpack_message(message[:-3])
+    assert rpc._unpack_message(message) == (main, small)
+    with pytest.raises(ValueError):
+        rpc._unpack_message(message, max_buffer_size=10)
+    # the main message can be larger than the frames
+    large_main = dict(main, args=[b"x" * 2 * rpc._max_frame_size])
+    assert rpc._unpack_message(msgpack.packb(large_main)) == (large_main, None)
+
+
+def test_compressed_message():
+    """Test the limit and the sender of compressed messages."""
+    rpc = RPC(
+        None, client_id="test-client", compression="zlib", max_message_buffer_size=4096
+    )
+    main = {"type": "test", "from": "ws/peer", "compression": "zlib"}
+    message = msgpack.packb(main) + zlib.compress(msgpack.packb({"x": b"0" * 5000}))
+    with pytest.raises(ValueError):
+        rpc._unpack_message(message)
+    message = msgpack.packb(main) + zlib.compress(msgpack.packb({"x": b"0" * 100}))
+    # the compression of the batched messages is recorded for the batch sender
+    rpc._on_message(
+        msgpack.packb({"type": "batch", "from": "ws/other"})
+        + msgpack.packb({"messages": [message]})
+    )
+    assert rpc._peer_compression == {"ws/other": "zlib"}
+
+
+def test_pack_message(rpc):
+    """Test packing messages without copying large segments."""
+    main = {"type": "method", "to": "test-client", "method": "services.a.b"}
+    for extra, is_list in [({"args": [1]}, False), ({"args": [b"x" * 100000]}, True)]:
+        message = rpc._pack_message(dict(main), extra)
+        assert isinstance(message, list) == is_list
+        if is_list:
+            message = b"".join(message)
+        assert rpc._unpack_message(message) == (main, extra)
+
+
+def test_inline_buffers(rpc):
+    """Test packing large payloads inline without copying them."""
+    image = np.arange(512 * 512, dtype="uint16").reshape(512, 512)
+    args = [image, b"x" * 5000, {"small": b"y" * 10}]
+    main = {"type": "method", "to": "test-client", "method": "services.a.b"}
+    expected = rpc._pack_message(dict(main), {"args": rpc._encode(args)})
+    buffers = InlineBuffers()
+    extra = {"args": rpc._encode(args, buffers=buffers)}
+    message = rpc._pack_message(dict(main), extra, buffers)
+    assert len(buffers) == 2 and isinstance(message, list)
+    # the image is referenced, not copied
+    assert any(np.shares_memory(piece, image) for piece in message)
+    assert b"".join(message) == b"".join(expected)
+
+
+def test_indexed_message_chunks(rpc):
+    """Test reassembling the chunks of a message appended out of order."""
+    received = []
+    rpc.on("test-chunks", received.append)
+    main = {"type": "test-chunks", "to": "test-client"}
+    message = rpc._pack_message(dict(main), {"data": b"x" * 100000})
+    message = b"".join(message)
+    chunks = [message[idx : idx + 30000] for idx in range(0, len(message), 30000)]
+    context = {"from": "ws/sender", "to": "ws/test-client", "user": {}}
+
+    rpc._create_message("chunked")
+    for idx in reversed(range(len(chunks))):
+        rpc._append_message("chunked", chunks[idx], index=idx)
+    rpc._process_message("chunked", context=context)
+    assert received[0]["data"] == b"x" * 100000
+
+    rpc._create_message("incomplete")
+    rpc._append_message("incomplete", chunks[0], index=0)
+    rpc._append_message("incomplete", chunks[2], index=2)
+    with pytest.raises(ValueError, match="missing chunks"):
+        rpc._process_message("incomplete", context=context)
+
+    # with a declared size, the chunks are written at their offsets
+    rpc._create_message("sized", size=len(message))
+    offsets = range(0, len(message), 30000)
+    for offset, chunk in reversed(list(zip(offsets, chunks))):
+        rpc._append_message("sized", chunk, offset=offset)
+    rpc._process_message("sized", context=context)
+    assert received[1]["data"] == b"x" * 100000
+    rpc._create_message("overflow", size=10)
+    with pytest.raises(ValueError, match="exceeds"):
+        rpc._append_message("overflow", chunks[0], offset=0)
+
+
+def test_spilled_message_cache():
+    """Test receiving a chunked message into a memory-mapped file."""
+    # the spilled messages are not limited by the maximum buffer size
+    rpc = RPC(
+        None,
+        client_id="test-client",
+        message_spill_threshold=1024,
+        max_message_buffer_size=100000,
+    )
+    received = []
+    rpc.on("test-chunks", received.append)
+    image = np.arange(256 * 256, dtype="uint16").reshape(256, 256)
+    buffers = []
+    extra = {"image": rpc._encode(image, buffers=buffers)}
+    message = rpc._pack_message({"type": "test-chunks"}, extra, buffers)
+    message = b"".join(message)
+    context = {"from": "ws/sender", "to": "ws/test-client", "user": {}}
+
+    rpc._create_message("spilled", size=len(message))
+    for offset in range(0, len(message), 30000):
+        rpc._append_message("spilled", message[offset : offset + 30000], offset=offset)
+    rpc._process_message("spilled", context=context)
+    # the out-of-band buffers are views into the memory-mapped file
+    assert isinstance(received[0]["image"]["_rvalue"].obj, mmap.mmap)
+    np.testing.assert_array_equal(rpc.decode(received[0]["image"]), image)
+
+
+def test_incremental_message_decode():
+    """Test decoding a compressed chunked message as the chunks arrive."""
+    rpc = RPC(None, client_id="test-client")
+    received = []
+    rpc.on("test-chunks", received.append)
+    extra = {"data": bytes(range(256)) * 1000, "items": list(range(1000))}
+    message = msgpack.packb({"type": "test-chunks", "compression": "zlib"})
+    message += zlib.compress(msgpack.packb(extra))
+    context = {"from": "ws/sender", "to": "ws/test-client", "user": {}}
+
+    rpc._create_message("compressed", size=len(message))
+    offsets = list(range(0, len(message), 1000))
+    # the chunks are decoded once the preceding data is received
+    for offset in offsets[1:-1] + offsets[:1]:
+        rpc._append_message(
+            "compressed", message[offset : offset + 1000], offset=offset
+        )
+    decoder = rpc._object_store["message_cache"]["compressed"].decoder
+    assert decoder.main["type"] == "test-chunks" and decoder.compression == "zlib"
+    assert rpc._object_store["message_cache"]["compressed"].decoded() is None
+    rpc._append_message("compressed", message[offsets[-1] :], offset=offsets[-1])
+    assert rpc._object_store["message_cache"]["compressed"].decoded() is decoder
+    rpc._process_message("compressed", context=context)
+    assert received[0]["data"] == extra["data"]
+    assert received[0]["items"] == extra["items"]
+
+    # the decompressed data is limited as for the messages unpacked at once
+    rpc._max_message_buffer_size = 200000
+    rpc._create_message("limited", size=len(message))
+    rpc._append_message("limited", message)
+    assert rpc._object_store["message_cache"]["limited"].decoded() is None
+    with pytest.raises(ValueError, match="limit"):
+        rpc._process_message("limited", context=context)
+
+
+def test_message_cache_offset():
+    """Test the committed offset and the expiry of incomplete messages."""
+    rpc = RPC(None, client_id="test-client", message_cache_ttl=0.1)
+    message = bytes(range(256)) * 1000
+    chunks = list(_iter_chunks(message, 30000))
+    assert b"".join(_iter_chunks([message[:1000], message[1000:]], 30000, 45000)) == (
+        message[45000:]
+    )
+
+    rpc._create_message("resumed", size=len(message))
+    for idx in [0, 1, 3]:
+        rpc._append_message("resumed", chunks[idx], offset=idx * 30000)
+    assert rpc._get_message_offset("resumed") == 60000
+    for idx, chunk in enumerate(_iter_chunks(message, 30000, 60000)):
+        rpc._append_message("resumed", chunk, offset=60000 + idx * 30000)
+    assert rpc._get_message_offset("resumed") == len(message)
+    # the chunks resent from the committed offset overlap the received ones
+    rpc._create_message("overlapping", size=3000)
+    rpc._append_message("overlapping", message[:1000], offset=0)
+    rpc._append_message("overlapping", message[1500:2000], offset=1500)
+    rpc._append_message("overlapping", message[1000:3000], offset=1000)
+    buffer = rpc._object_store["message_cache"]["overlapping"].getbuffer()
+    assert bytes(buffer) == message[:3000]
+
+    time.sleep(0.2)
+    rpc._create_message("other")
+    with pytest.raises(KeyError):
+        rpc._get_message_offset("resumed")
+    assert rpc._object_store["message_cache"].expired == 2
+
+
+@pytest.mark.asyncio
+async def test_send_chunks_errors(monkeypatch):
+    """Test resuming the upload of a long message only after transient errors."""
+    monkeypatch.setattr("imjoy_rpc.hypha.rpc.CHUNK_RESUME_DELAY", 0)
+    rpc = RPC(None, client_id="test-client", chunk_size=30000)
+    message = bytes(range(256)) * 1000
+    received = bytearray(len(message))
+    errors = []
+
+    async def create(message_id, session=False, size=None):
+        pass
+
+    async def append(message_id, data, session=False, offset=0):
+        if errors and offset == 90000:
+            raise errors.pop()
+        received[offset : offset + len(data)] = data
+
+    async def offset(message_id):
+        return 60000
+
+    async def process(message_id, session=False):
+        pass
+
+    message_cache = dotdict(
+        sized=True,
+        offset=offset,
+        create=create,
+        append=append,
+        process=process,
+    )
+
+    async def get_remote_service(service_uri):
+        return dotdict(message_cache=message_cache)
+
+    rpc.get_remote_service = get_remote_service
+    errors.append(ConnectionError("connection lost"))
+    await rpc._send_chunks(message, "ws/peer", None)
+    assert received == message
+
+    errors.append(RemoteException("RemoteError: message evicted"))
+    with pytest.raises(RemoteException):
+        await rpc._send_chunks(message, "ws/peer", None)
+
+
+@pytest.mark.asyncio
+async def test_message_cache_sweep():
+    """Test removing the expired messages without other messages arriving."""
+    rpc = RPC(
+        None,
+        client_id="test-client",
+        message_cache_ttl=0.1,
+        loop=asyncio.get_running_loop(),
+    )
+    rpc._create_message("abandoned", size=1000)
+    cache = rpc._object_store["message_cache"]
+    await asyncio.sleep(0.3)
+    assert not cache and cache.expired == 1
+    # the sweep stops while the cache is empty
+    assert cache._sweep_handle is None
+
+
+def test_message_cache_eviction():
+    """Test limiting the size of the message cache."""
+    rpc = RPC(None, client_id="test-client", message_cache_size=100000)
+    rpc._create_message("first", size=60000)
+    rpc._create_message("second", size=30000)
+    rpc._append_message("first", b"x" * 1000)
+    # the least recently updated message is evicted
+    rpc._create_message("third", size=40000)
+    cache = rpc._object_store["message_cache"]
+    assert list(cache) == ["first", "third"] and cache.evicted == 1
+    with pytest.raises(ValueError, match="exceeds"):
+        rpc._create_message("large", size=200000)
+    rpc._create_message("growing")
+    with pytest.raises(ValueError, match="exceeds"):
+        rpc._append_message("growing", b"x" * 150000)
+    assert list(cache) == ["first", "third"]
+    assert cache.rejected == 2 and cache.evicted == 1
+    assert cache.nbytes == sum(buffer.nbytes for buffer in cache.values())
+    # the declared size and the cache size are limited by default
+    rpc = RPC(None, client_id="test-client")
+    with pytest.raises(ValueError, match="exceeds"):
+        rpc._create_message("huge", size=2**40)
+    assert rpc._object_store["message_cache"].max_size == MESSAGE_CACHE_SIZE
+
+
+def test_chunk_store():
+    """Test appending the chunks of the chunk store to a message."""
+    rpc = RPC(None, client_id="test-client", chunk_store_size=80000)
+    message = bytes(range(256)) * 400
+    chunks = list(_iter_chunks([message[:50000], message[50000:]], 30000, aligned=True))
+    assert [len(chunk) for chunk in chunks] == [30000, 20000, 30000, 22400]
+    hashes = [_hash_chunk(chunk) for chunk in chunks]
+
+    rpc._create_message("first", size=len(message))
+    offset = 0
+    for chunk in chunks:
+        rpc._append_message("first", chunk, offset=offset, store=True)
+        offset += len(chunk)
+    # the least recently used chunks are evicted
+    assert rpc._chunk_store.size == 72400
+
+    rpc._create_message("second", size=len(message))
+    offsets = [0, 30000, 50000, 80000]
+    found = rpc._append_cached_chunks("second", hashes, offsets)
+    assert found == [False, True, True, True]
+    rpc._append_message("second", chunks[0], offset=0)
+    assert bytes(rpc._object_store["message_cache"]["second"].getbuffer()) == message
+
+
+def test_chunk_size_controller():
+    """Test adapting the chunk size to the measured link."""
+    # a fast link with a low latency, the chunks grow up to the maximum size
+    controller = ChunkSizeController(500 * 1024, 64 * 1024, 4 * 1024 * 1024)
+    for _ in range(10):
+        controller.update(0.005, 200e6, window=16)
+    assert controller.chunk_size == 4 * 1024 * 1024
+    # a slow link, the chunks shrink
+    controller = ChunkSizeController(500 * 1024, 64 * 1024, 4 * 1024 * 1024)
+    controller.update(0.5, 1e6, window=16)
+    assert controller.chunk_size == 250 * 1024
+    for _ in range(10):
+        controller.update(0.5, 1e6, window=16)
+    assert 64 * 1024 <= controller.chunk_size < 200 * 1024
+    # the chunks in flight cover the round-trip time
+    controller = ChunkSizeController(500 * 1024, 64 * 1024, 8 * 1024 * 1024)
+    for _ in range(20):
+        controller.update(1.6, 20e6, window=16)
+    assert controller.chunk_size == pytest.approx(2e6, rel=0.01)
+
+    # the messages sent in one frame leave room for the routing fields
+    rpc = RPC(None, client_id="test-client")
+    rpc._get_chunk_controller("ws/peer", {"max_frame_size": 1024000})
+    assert rpc._get_max_message_size("ws/peer") <= 1024000 - 8 * 1024
+    for idx in range(2000):
+        rpc._peer_batch[f"ws/peer-{idx}"] = False
+    assert len(rpc._peer_batch) == PEER_CACHE_SIZE
+
+    chunks = _iter_chunks(b"x" * 1000, iter([100, 300, 500, 700]).__next__)
+    assert [len(chunk) for chunk in chunks] == [100, 300, 500, 100]
+
+
+@pytest.mark.asyncio
+async def test_batch_messages():
+    """Test the order and the errors of batched messages."""
+    rpc = RPC(None, client_id="test-client", batch_window=0)
+    sent = []
+
+    async def emit_message(package):
+        sent.append(package)
+
+    rpc._emit_message = emit_message
+    rpc._peer_batch["ws/peer"] = True
+    first = rpc._send_message(msgpack.packb({"type": "a"}), "ws/peer")
+    second = rpc._send_message(msgpack.packb({"type": "b"}), "ws/peer")
+    # a message which is not batched is sent after the pending batch
+    large = [msgpack.packb({"type": "c"}), b"x" * 100000]
+    await asyncio.gather(first, second, rpc._send_message(large, "ws/peer"))
+    assert len(sent) == 2 and sent[1] is large
+    main, extra = rpc._unpack_message(sent[0])
+    assert main["type"] == "batch" and len(extra["messages"]) == 2
+
+    rpc._pack_message = None
+    failed = rpc._send_message(msgpack.packb({"type": "a"}), "ws/peer")
+    rpc._send_message(msgpack.packb({"type": "b"}), "ws/peer")
+    with pytest.raises(TypeError):
+        await failed
+
+    # the messages of a batch are handled even if one of them fails
+    received = []
+    rpc.on("ok", received.append)
+    messages = [msgpack.packb({"no-type": 1}), msgpack.packb({"type": "ok"})]
+    rpc._on_message(
+        msgpack.packb({"type": "batch", "from": "ws/peer"})
+        + msgpack.packb({"messages": messages})
+    )
+    assert received[0]["from"] == "ws/peer"
+
+    # the frames which fail are dropped, the next ones are handled
+    rpc._on_message(b"\xc1" + b"x" * 10)
+    rpc._on_message(b"x" * (rpc._max_frame_size + 1))
+    rpc._on_message(msgpack.packb({"type": "ok", "from": "ws/other"}))
+    assert received[-1]["from"] == "ws/other"
@@ -1,6 +1,12 @@
 """Tests for the utils module."""
 from functools import partial
-from imjoy_rpc.hypha.utils import callable_sig, callable_doc, make_signature
+from imjoy_rpc.hypha.utils import (
+    callable_sig,
+    callable_doc,
+    extract_function_info,
+    make_signature,
+)
+from imjoy_rpc.utils import CodecRegistry, dotdict
 
 from inspect import signature
 from typing import Union, Optional
@@ -145,3 +151,60 @@ def test_callable_doc():
 
     partial_func = partial(partial_func_with_doc, b=3)
     assert callable_doc(partial_func) == "This is a partial function with a docstring"
+
+
+def test_callable_metadata_cache():
+    """Test the cached signature and docstring of callables."""
+
+    class Counter:
+        def count(self, start, step=1, context=None):
+            """Count from start."""
+            return start + step
+
+    counter = Counter()
+    # Bound methods are cached on the underlying function
+    assert callable_sig(counter.count) == "count(start, step=1, context=None)"
+    assert callable_sig(counter.count, skip_context=True) == "count(start, step=1)"
+    assert callable_sig(Counter.count) == "count(self, start, step=1, context=None)"
+    assert callable_doc(counter.count) == "Count from start."
+
+    def func(a, b, context=None):
+        return a + b
+
+    assert callable_sig(partial(func, b=1)) == "func(a, context=None)"
+    assert callable_sig(partial(func, b=1, context=2)) == "func(a)"
+    assert callable_sig(func) == "func(a, b, context=None)"
+
+
+def test_extract_function_info():
+    """Test extract_function_info."""
+
+    def func(a, b=2) -> int:
+        """Add numbers."""
+        return a + b
+
+    assert extract_function_info(func) == {
+        "name": "func",
+        "sig": "a, b=2",
+        "doc": "Add numbers.",
+    }
+
+
+def test_codec_registry():
+    """Test resolving the encoders of the registered codecs."""
+
+    class Base:
+        pass
+
+    class Derived(Base):
+        pass
+
+    codecs = CodecRegistry()
+    codecs["base"] = dotdict(name="base", type=Base, encoder=str)
+    assert codecs.find_encoder(Derived).name == "base"
+    # registering a codec clears the resolved encoders
+    codecs["derived"] = dotdict(name="derived", type=Derived, encoder=str)
+    assert codecs.find_encoder(Derived).name == "derived"
+    del codecs["derived"]
+    assert codecs.find_encoder(Derived).name == "base"
+    assert codecs.find_encoder(int) is None
@@ -364,3 +364,128 @@ def test_connect_to_server_sync_lock(websocket_server):
     # This will not work if the thread is locked
     svc = server.get_service("hello-world")
     svc.call_hello2()
+
+
+@pytest.mark.asyncio
+async def test_numpy_array_oob_buffers(websocket_server):
+    """Test sending numpy arrays as out-of-band buffers."""
+    ws = await connect_to_server(
+        {"client_id": "test-plugin-oob", "server_url": WS_SERVER_URL}
+    )
+    await ws.export(ImJoyPlugin(ws))
+    workspace = ws.config.workspace
+    token = await ws.generate_token()
+
+    api = await connect_to_server(
+        {
+            "client_id": "client-oob",
+            "workspace": workspace,
+            "token": token,
+            "server_url": WS_SERVER_URL,
+            "oob_buffers": True,
+        }
+    )
+    plugin = await api.get_service("test-plugin-oob:default")
+    small_array = np.arange(1024, dtype="uint16").reshape(32, 32)
+    result = await plugin.add(small_array[:, ::2])
+    np.testing.assert_array_equal(result, small_array[:, ::2] + 1.0)
+
+    large_array = np.zeros([2048, 2048, 4], dtype="float32")
+    result = await plugin.add(large_array)
+    np.testing.assert_array_equal(result, large_array + 1.0)
+    # the peer advertises the support of out-of-band buffers
+    assert api.rpc._peer_encoding[f"{workspace}/test-plugin-oob"]["oob_buffers"]
+
+
+@pytest.mark.asyncio
+async def test_compression(websocket_server):
+    """Test sending compressed messages to a peer."""
+    ws = await connect_to_server(
+        {"client_id": "test-plugin-compression", "server_url": WS_SERVER_URL}
+    )
+    await ws.export(ImJoyPlugin(ws))
+    workspace = ws.config.workspace
+    token = await ws.generate_token()
+
+    api = await connect_to_server(
+        {
+            "client_id": "client-compression",
+            "workspace": workspace,
+            "token": token,
+            "server_url": WS_SERVER_URL,
+            "compression": "zlib",
+        }
+    )
+    plugin = await api.get_service("test-plugin-compression:default")
+    labels = np.zeros([1024, 1024], dtype="uint16")
+    labels[100:300, 200:600] = 7
+    for _ in range(3):
+        result = await plugin.add(labels)
+        np.testing.assert_array_equal(result, labels + 1.0)
+    assert api.rpc._peer_compression[f"{workspace}/test-plugin-compression"] == "zlib"
+
+
+@pytest.mark.asyncio
+async def test_emit_large_message(websocket_server):
+    """Test emitting a message larger than the chunk size to a peer."""
+    ws = await connect_to_server(
+        {"client_id": "test-plugin-emit", "server_url": WS_SERVER_URL}
+    )
+    workspace = ws.config.workspace
+    token = await ws.generate_token()
+    received = asyncio.get_running_loop().create_future()
+    ws.on("frame", received.set_result)
+
+    api = await connect_to_server(
+        {
+            "client_id": "client-emit",
+            "workspace": workspace,
+            "token": token,
+            "server_url": WS_SERVER_URL,
+        }
+    )
+    data = bytes(range(256)) * 8192
+    await api.emit({"type": "frame", "to": "test-plugin-emit", "data": data})
+    message = await asyncio.wait_for(received, timeout=10)
+    assert message["data"] == data
+    assert message["from"] == f"{workspace}/client-emit"
+
+
+@pytest.mark.asyncio
+async def test_batch_window(websocket_server):
+    """Test batching the concurrent calls to a peer."""
+    ws = await connect_to_server(
+        {
+            "client_id": "test-plugin-batch",
+            "server_url": WS_SERVER_URL,
+            "batch_window": 0,
+        }
+    )
+    await ws.export(ImJoyPlugin(ws))
+    workspace = ws.config.workspace
+    token = await ws.generate_token()
+
+    api = await connect_to_server(
+        {
+            "client_id": "client-batch",
+            "workspace": workspace,
+            "token": token,
+            "server_url": WS_SERVER_URL,
+            "batch_window": 0.01,
+        }
+    )
+    plugin = await api.get_service("test-plugin-batch:default")
+    assert await plugin.add(1) == 2
+    await asyncio.sleep(0.1)
+    assert api.rpc._peer_batch[f"{workspace}/test-plugin-batch"]
+    results = await asyncio.gather(*[plugin.add(idx) for idx in range(200)])
+    assert results == [idx + 1.0 for idx in range(200)]
+
+    # a peer without batch support receives the messages one by one
+    del ws.rpc._services["built-in"]["batch"]
+    api.rpc._peer_batch.clear()
+    assert await plugin.add(2) == 3
+    await asyncio.sleep(0.1)
+    assert not api.rpc._peer_batch[f"{workspace}/test-plugin-batch"]
+    results = await asyncio.gather(*[plugin.add(idx) for idx in range(20)])
+    assert results == [idx + 1.0 for idx in range(20)]